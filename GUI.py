@@ -1,12 +1,86 @@
-from PyQt5 import  QtWidgets
-from gforce import GForceProfile
-from  searchwindow import SearchWindow
+import time
+import sys
+
+START = time.perf_counter()
+STDLIB = set(getattr(sys, 'stdlib_module_names', ())) | {'cython_runtime'}
+
+
+class StartupProfile():
+    """
+    Times the startup phases of the GUI and lists the packages imported in each.
+
+    For a per-module breakdown run `python -X importtime GUI.py`.
+
+    Methods:
+        mark(phase): Ends the current phase under the given name.
+        report(): Prints the duration and new top-level packages of every phase.
+    """
+    def __init__(self):
+        self.phases = []
+        self._time = START
+        self._modules = set(sys.modules)
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        modules = set(sys.modules)
+        # Standard library modules are left out of the list, they are rarely what is slow.
+        packages = sorted({name.split('.')[0] for name in modules - self._modules if not name.startswith('_')} - STDLIB)
+        self.phases.append((phase, now - self._time, len(modules - self._modules), packages))
+        self._time, self._modules = now, modules
+
+    def report(self):
+        print("Startup profile:")
+        for phase, seconds, nModules, packages in self.phases:
+            print(f"{seconds*1000:8.1f} ms  {phase}" + (f" ({nModules} modules: {', '.join(packages)})" if nModules else ""))
+        print(f"{(self._time - START)*1000:8.1f} ms  until the scan page was shown")
+        sys.stdout.flush()
+
 
 if __name__ == "__main__":
-    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--canvas', choices=['matplotlib', 'pyqtgraph'], default='matplotlib',
+                        help='plotting backend of the visualisation page')
+    parser.add_argument('--simulate', action='store_true',
+                        help='use a simulated armband instead of Bluetooth')
+    parser.add_argument('--replay', metavar='RECORDING',
+                        help='play a .emg or .txt recording through a simulated armband')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='replay speed, 1 for real time, 0 for as fast as possible')
+    parser.add_argument('--start', type=float, default=0.0,
+                        help='replay start time in seconds')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print how long each startup phase took and what it imported')
+    args, qt_args = parser.parse_known_args()
+    profile = StartupProfile()
+
+    # Only what the scan page needs is imported here; the canvas, the model and the
+    # recorder are imported when the visualisation page or inference first needs them.
+    from PyQt5 import QtWidgets, QtCore
+    profile.mark("import PyQt5")
+    from gforce import GForceProfile
+    from searchwindow import SearchWindow
+    profile.mark("import gforce, searchwindow")
 
-    GF = GForceProfile()
-    app = QtWidgets.QApplication(sys.argv)
-    w = SearchWindow(GF)
+    if args.replay:
+        from replay import ReplayPeripheral
+        from simdevice import SimulatedScanner
+        GF = GForceProfile(ReplayPeripheral(args.replay, args.speed, args.start), SimulatedScanner())
+    elif args.simulate:
+        from simdevice import SimulatedPeripheral, SimulatedScanner
+        GF = GForceProfile(SimulatedPeripheral(), SimulatedScanner())
+    else:
+        GF = GForceProfile()
+    profile.mark("create GForceProfile")
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+    w = SearchWindow(GF, canvas=args.canvas)
+    profile.mark("build scan page")
     w.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    if args.profile_startup:
+        def report():
+            profile.mark("show scan page")
+            profile.report()
+        # Runs once the event loop has processed the show, i.e. the window is on screen.
+        QtCore.QTimer.singleShot(0, report)
+    sys.exit(app.exec_())
@@ -0,0 +1,221 @@
+"""
+Headless micro-benchmarks for the EMG processing code.
+
+    python benchmark.py features     # feature bank cost per window vs. the 50 ms UI tick
+    python benchmark.py canvas       # frame time of the matplotlib and pyqtgraph canvases
+    python benchmark.py pipeline [recordings...]
+                                     # replay recordings through decode, windowing, features,
+                                     # classifier and plot model
+
+The canvas suite needs PyQt5; without a display it renders off-screen. The
+pipeline suite needs neither Qt nor a Bluetooth adapter.
+"""
+import argparse
+import glob
+import os
+import time
+import tracemalloc
+import numpy as np
+
+from features import FEATURES, feature_bank
+
+UI_TICK = 0.050
+
+
+def timeit(fn, repeat=50):
+    """
+    Calls fn() `repeat` times.
+
+    Returns:
+        array: Duration of every call in seconds.
+    """
+    times = np.empty(repeat)
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times[i] = time.perf_counter() - t0
+    return times
+
+
+def bench_features(nChannels=8, windowLength=50, batches=(1, 20, 1000), repeat=50):
+    """
+    Times feature_bank() for each feature alone and for the full set, live (one
+    window per call) and batched, and prints the median cost per window.
+    """
+    rng = np.random.default_rng(0)
+    print(f"{'features':<28}{'batch':>7}{'us/window':>12}{'% of tick':>11}")
+    for names in [(name,) for name in FEATURES] + [FEATURES]:
+        for batch in batches:
+            windows = rng.normal(scale=0.05, size=(batch, nChannels, windowLength)).astype(np.float32)
+            perWindow = np.median(timeit(lambda: feature_bank(windows, names), repeat)) / batch
+            label = 'all' if names == FEATURES else names[0]
+            print(f"{label:<28}{batch:>7}{perWindow * 1e6:>12.1f}{100 * perWindow / UI_TICK:>10.2f}%")
+
+
+def bench_canvas(frames=200):
+    """
+    Feeds both plotting canvases one [rms, ch1..ch8] value per frame and prints
+    percentiles of the time to update and repaint a frame.
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5 import QtWidgets
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    from customcanvas import CustomFigCanvas
+    from pgcanvas import PgFigCanvas
+
+    rng = np.random.default_rng(0)
+    print(f"{'canvas':<12}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for name, cls in (('matplotlib', CustomFigCanvas), ('pyqtgraph', PgFigCanvas)):
+        canvas = cls()
+        canvas.resize(1200, 500)
+        canvas.show()
+        canvas.update_amp(0.3)
+        app.processEvents()
+        # Frames are driven by hand below, not by the canvas' own timer.
+        if name == 'matplotlib':
+            canvas.event_source.stop()
+        else:
+            canvas.timer.stop()
+        times = np.empty(frames)
+        for i in range(frames):
+            canvas.addData([0.3 + 0.1 * np.sin(i / 10)] + list(rng.normal(size=8)))
+            t0 = time.perf_counter()
+            if name == 'matplotlib':
+                canvas._step()
+            else:
+                # The scene only repaints what setData invalidated, when events are processed.
+                canvas._draw_frame()
+            app.processEvents()
+            times[i] = time.perf_counter() - t0
+        ms = times * 1000
+        print(f"{name:<12}{np.percentile(ms, 50):>9.2f}{np.percentile(ms, 95):>9.2f}{ms.max():>9.2f}")
+        canvas.close()
+
+
+def run_pipeline(packets, decoder, model, times=None):
+    """
+    Runs packets through the live processing path without threads or Qt: decode,
+    ring buffer, windowing, running window features, classifier and plot model.
+
+    Args:
+        packets (list of bytes): Notification packets in arrival order.
+        decoder (EmgRawDataDecoder): Decoder for the packets.
+        model: Classifier with predict_proba(), fed the per-channel RMS of every window.
+        times (dict): If given, per-call durations in seconds are appended under
+            'decode', 'buffer', 'window', 'features', 'classifier' and 'plot'.
+
+    Returns:
+        int: Number of windows processed.
+    """
+    from features import OFFSET, RunningWindowStats
+    from plotmodel import FrameQueue, PlotDataModel
+    from ringbuffer import SampleRingBuffer
+    from windowing import WindowEngine
+
+    clock = time.perf_counter
+    record = (lambda stage, t0: times[stage].append(clock() - t0)) if times is not None else (lambda stage, t0: None)
+    buffer = SampleRingBuffer(60 * 500, decoder.nChannels, decoder.dtype)
+    engine = WindowEngine(buffer, 50, 25)
+    stats = RunningWindowStats(decoder.nChannels, engine.length, OFFSET, 1)
+    plotQueue, plotModel = FrameQueue(), PlotDataModel(nChannels=decoder.nChannels)
+    windows = 0
+    for packet in packets:
+        t0 = clock()
+        block = decoder.decode(packet)
+        record('decode', t0)
+        t0 = clock()
+        buffer.write(block)
+        record('buffer', t0)
+        while True:
+            t0 = clock()
+            item = engine.next_window(timeout=0)
+            if item is None:
+                break
+            record('window', t0)
+            start, window = item
+            t0 = clock()
+            stats.update(start, window)
+            mean, rms = stats.mean(), stats.rms() / 255
+            record('features', t0)
+            t0 = clock()
+            model.predict_proba(rms[None])
+            record('classifier', t0)
+            t0 = clock()
+            plotQueue.put([rms.sum()] + list(mean))
+            plotModel.push_block(plotQueue.drain())
+            record('plot', t0)
+            windows += 1
+    return windows
+
+
+def bench_pipeline(paths=(), loops=50):
+    """
+    Replays recordings `loops` times through run_pipeline() and prints the
+    throughput in samples/s, per-stage latency percentiles and the peak memory
+    allocated while processing.
+
+    Args:
+        paths (list of str): Recordings to replay, by default everything in recordingfiles/.
+        loops (int): Number of times each recording is replayed.
+    """
+    from inference import MODEL_PATH, LinearPredictor
+    from replay import recording_packets
+
+    paths = list(paths) or sorted(glob.glob('recordingfiles/**/*.txt', recursive=True) +
+                                  glob.glob('recordingfiles/**/*.emg', recursive=True))
+    replays = [recording_packets(path) for path in paths]
+    replays = [(packets, decoder) for packets, decoder in replays if packets]
+    if not replays:
+        print("No samples in", paths)
+        return
+    nChannels = replays[0][1].nChannels
+    if os.path.exists(MODEL_PATH):
+        model = LinearPredictor.load(MODEL_PATH)
+    else:
+        # Same cost as the trained model: RMS of every channel in, nine motions out.
+        rng = np.random.default_rng(0)
+        model = LinearPredictor(rng.normal(size=(9, nChannels)), rng.normal(size=9), np.arange(9))
+    nSamples = loops * sum(len(decoder.decode(packet)) for packets, decoder in replays for packet in packets)
+
+    # Wall time without per-stage instrumentation, then per-stage times, then memory.
+    t0 = time.perf_counter()
+    for _ in range(loops):
+        for packets, decoder in replays:
+            run_pipeline(packets, decoder, model)
+    elapsed = time.perf_counter() - t0
+
+    times = {stage: [] for stage in ('decode', 'buffer', 'window', 'features', 'classifier', 'plot')}
+    for _ in range(loops):
+        for packets, decoder in replays:
+            run_pipeline(packets, decoder, model, times)
+
+    tracemalloc.start()
+    for packets, decoder in replays:
+        run_pipeline(packets, decoder, model)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{len(replays)} recording(s) x {loops}: {nSamples} samples in {elapsed:.2f} s, "
+          f"{nSamples / elapsed:,.0f} samples/s ({nSamples / elapsed / 500:,.0f}x real time at 500 Hz)")
+    print(f"{'stage':<12}{'calls':>9}{'p50 us':>9}{'p95 us':>9}{'p99 us':>9}{'total %':>9}")
+    total = sum(sum(t) for t in times.values())
+    for stage, t in times.items():
+        us = np.array(t) * 1e6
+        print(f"{stage:<12}{len(us):>9}{np.percentile(us, 50):>9.1f}{np.percentile(us, 95):>9.1f}"
+              f"{np.percentile(us, 99):>9.1f}{100 * us.sum() / 1e6 / total:>8.1f}%")
+    print(f"peak memory allocated per replay: {peak / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('suite', choices=['features', 'canvas', 'pipeline'])
+    parser.add_argument('paths', nargs='*', help='recordings replayed by the pipeline suite')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    if args.suite == 'features':
+        bench_features(repeat=args.repeat)
+    elif args.suite == 'canvas':
+        bench_canvas()
+    elif args.suite == 'pipeline':
+        bench_pipeline(args.paths, loops=args.repeat)
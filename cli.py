@@ -0,0 +1,262 @@
+"""
+Headless acquisition: connects to the armband, streams EMG to a recording and/or
+the live classifier and prints throughput statistics, without Qt or matplotlib,
+e.g. on the Raspberry Pi that drives the hand.
+
+    sudo python cli.py --record session.emg --seconds 60
+    sudo python cli.py --address C0:00:00:00:00:01 --classify
+    python cli.py --simulate --classify --record sim.emg --seconds 10
+    python cli.py --replay Subject_2/Shift_0/Motion_1_Rep_1.txt --speed 0 --classify
+"""
+import argparse
+import os
+import threading
+import time
+
+from features import RunningWindowStats
+from gforce import DataNotifFlags, EmgRawDataDecoder, GForceProfile
+from helpers import set_cmd_cb
+from recording import PART_EXT, RecordingSink, RecordingWriter
+from ringbuffer import SampleRingBuffer
+from windowing import WindowEngine
+
+
+class HeadlessSession():
+    """
+    Receives the EMG notifications of a connected armband without any UI.
+
+    Every packet is decoded once into a ring buffer and, if recording, queued to a
+    RecordingSink. With a classifier, a window thread computes the RMS of every
+    window as searchwindow.dataSendLoop() does and submits it to an InferenceWorker.
+
+    Attributes:
+        buffer (SampleRingBuffer): The last minute of decoded samples.
+        recorder (RecordingSink): The recording, None if not recording.
+        predictor (InferenceWorker): The classifier, None if not classifying.
+        engine (WindowEngine): Window source of the classifier.
+        packets (int): Packets received.
+        label: Last published (smoothed) prediction.
+
+    Methods:
+        ondata(data): Notification callback for GForceProfile.startDataNotification().
+        start(): Starts the window thread.
+        stop(): Stops the window thread, the classifier and the recording.
+        stats(): Throughput and latency figures since the last call.
+    """
+    def __init__(self, sampRate, channelMask, resolution, recordPath=None, model=None, windowLength=50,
+                 windowOverlap=25, smoother=None, onPrediction=None, **header):
+        """
+        Args:
+            sampRate (int): Sample rate configured on the armband.
+            channelMask (int): Enabled channels.
+            resolution (int): 8 or 12 bit.
+            recordPath (str): Binary recording to write, None to not record.
+            model: Classifier with predict_proba() and classes_, None to not classify.
+            windowLength (int): Window length of the classifier in samples.
+            windowOverlap (int): Overlap of consecutive windows in samples.
+            smoother (DecisionSmoother): Post-processing of the predictions.
+            onPrediction (function): Called with [label, confidence, latency] of every prediction.
+            **header: subject, motion, rep and shift stored in the recording.
+        """
+        self.sampRate = sampRate
+        self.decoder = EmgRawDataDecoder(channelMask, resolution)
+        self.buffer = SampleRingBuffer(60*sampRate, self.decoder.nChannels, self.decoder.dtype,
+                                       margin=windowLength)
+        self.recorder = None
+        if recordPath:
+            self.recorder = RecordingSink(RecordingWriter(recordPath + PART_EXT, sampRate, channelMask, resolution,
+                                                          **header))
+        self.predictor = None
+        self.engine = None
+        if model is not None:
+            # Imported here so recording-only sessions never load the inference code.
+            from inference import InferenceWorker
+            self.engine = WindowEngine(self.buffer, windowLength, windowLength - windowOverlap)
+            self.predictor = InferenceWorker(model, self._onPrediction, smoother=smoother)
+        self.onPrediction = onPrediction
+        self.label = None
+        self.packets = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._last = (time.perf_counter(), 0, 0)
+
+    def ondata(self, data):
+        block = self.decoder.decode(data)
+        self.buffer.write(block)
+        self.packets += 1
+        if self.recorder:
+            self.recorder.put(block)
+
+    def _onPrediction(self, value):
+        if self.onPrediction:
+            self.onPrediction(value)
+        self.label = value[0]
+
+    def _windowLoop(self):
+        stats = RunningWindowStats(self.buffer.n_channels, self.engine.length)
+        while not self._stop.is_set():
+            item = self.engine.next_window(timeout=0.5)
+            if item is None:
+                continue
+            start, window = item
+            arrival = time.perf_counter()
+            stats.update(start, window)
+            rms = stats.rms()
+            self.predictor.submit(rms, arrival, rms.sum())
+
+    def start(self):
+        if self.engine:
+            self.engine.cursor = self.buffer.count
+            self._thread = threading.Thread(name='windowLoop', target=self._windowLoop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stops classifying and closes the recording, moving it to its final path.
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self.predictor:
+            self.predictor.stop()
+        if self.recorder:
+            self.recorder.finalize(self.recorder.path[:-len(PART_EXT)])
+
+    def stats(self):
+        """
+        Returns:
+            dict: samples/s and packets/s since the previous call, total samples, and
+            depending on the session the recording size, queue depth and dropped
+            samples, the windows dropped by the window engine and the inference latency.
+        """
+        now, samples, packets = time.perf_counter(), self.buffer.count, self.packets
+        then, lastSamples, lastPackets = self._last
+        self._last = (now, samples, packets)
+        elapsed = max(now - then, 1e-9)
+        stats = dict(samples=samples, samples_per_s=(samples - lastSamples) / elapsed,
+                     packets_per_s=(packets - lastPackets) / elapsed)
+        if self.recorder:
+            stats.update(recorded_bytes=self.recorder.bytesWritten, record_queue=self.recorder.queueDepth,
+                         record_dropped=self.recorder.dropped)
+        if self.predictor:
+            stats.update(windows_dropped=self.engine.dropped + self.predictor.dropped,
+                         **{f'latency_{k}_ms': v for k, v in self.predictor.latency_stats().items()})
+        return stats
+
+
+def make_profile(simulate=False, replay=None, speed=1.0, start=0.0):
+    """
+    Creates the GForceProfile for a real, simulated or replayed armband.
+
+    Returns:
+        tuple (GForceProfile, ReplaySource): The profile and, when replaying, the
+        source whose `finished` event is set at the end of the recording.
+    """
+    if replay:
+        from replay import ReplayPeripheral
+        from simdevice import SimulatedScanner
+        peripheral = ReplayPeripheral(replay, speed, start)
+        return GForceProfile(peripheral, SimulatedScanner()), peripheral.source
+    if simulate:
+        from simdevice import SimulatedPeripheral, SimulatedScanner
+        return GForceProfile(SimulatedPeripheral(), SimulatedScanner()), None
+    return GForceProfile(), None
+
+
+def format_stats(stats):
+    parts = [f"{stats['samples_per_s']:7.0f} samples/s", f"{stats['packets_per_s']:5.0f} packets/s",
+             f"{stats['samples']} samples"]
+    if 'recorded_bytes' in stats:
+        parts.append(f"recorded {stats['recorded_bytes'] / 1e6:.2f} MB (queue {stats['record_queue']}, "
+                     f"dropped {stats['record_dropped']})")
+    if 'windows_dropped' in stats:
+        latency = f"p50 {stats['latency_p50_ms']:.1f} / p95 {stats['latency_p95_ms']:.1f} ms" \
+            if 'latency_p50_ms' in stats else 'n/a'
+        parts.append(f"inference {latency}, dropped {stats['windows_dropped']} windows")
+    return ', '.join(parts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_argument_group('armband')
+    source.add_argument('--address', help='connect to this address instead of the strongest armband found')
+    source.add_argument('--simulate', action='store_true', help='use a simulated armband instead of Bluetooth')
+    source.add_argument('--replay', metavar='RECORDING', help='play a .emg or .txt recording through a simulated armband')
+    source.add_argument('--speed', type=float, default=1.0, help='replay speed, 1 for real time, 0 for as fast as possible')
+    source.add_argument('--start', type=float, default=0.0, help='replay start time in seconds')
+    source.add_argument('--sampRate', type=int, default=500)
+    source.add_argument('--channelMask', type=lambda x: int(x, 0), default=0xFF)
+    source.add_argument('--dataLen', type=int, default=128)
+    source.add_argument('--resolution', type=int, choices=[8, 12], default=8)
+    output = parser.add_argument_group('output')
+    output.add_argument('--record', metavar='PATH', help='write the raw samples to this .emg recording')
+    output.add_argument('--subject', type=int, default=-1)
+    output.add_argument('--motion', type=int, default=-1)
+    output.add_argument('--rep', type=int, default=-1)
+    output.add_argument('--shift', type=int, default=-1)
+    output.add_argument('--classify', action='store_true', help='classify every window and print the motion')
+    output.add_argument('--model', help='classifier to load, see inference.load_model()')
+    output.add_argument('--windowLength', type=int, default=50, help='classifier window length in samples')
+    output.add_argument('--windowOverlap', type=int, default=25, help='overlap of consecutive windows in samples')
+    output.add_argument('--vote', type=int, default=5, help='majority vote length in windows')
+    output.add_argument('--minConfidence', type=float, default=0.5)
+    parser.add_argument('--seconds', type=float, help='stop after this long, runs until Ctrl-C by default')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between statistics lines')
+    args = parser.parse_args()
+    if not args.record and not args.classify:
+        parser.error('nothing to do, give --record and/or --classify')
+    if args.classify and args.resolution != 8:
+        # The features are (raw - OFFSET) / SCALE of 8-bit samples, as the models were trained on.
+        parser.error('--classify needs --resolution 8, the classifier is trained on 8-bit features')
+
+    model = smoother = None
+    if args.classify:
+        from inference import load_model
+        from postprocessing import DecisionSmoother
+        model = load_model(args.model)
+        smoother = DecisionSmoother(args.vote, args.minConfidence, restLabel=len(model.classes_) - 1,
+                                    hop=(args.windowLength - args.windowOverlap) / args.sampRate)
+
+    def show_prediction(value):
+        label, confidence, latency = value
+        if label != session.label:
+            print(f"Motion {int(label) + 1} ({confidence:.0%}, {latency * 1000:.1f} ms)")
+
+    GF, replaySource = make_profile(args.simulate, args.replay, args.speed, args.start)
+    if args.address:
+        GF.connect(args.address)
+    else:
+        GF.connectByRssi()
+    if args.record:
+        os.makedirs(os.path.dirname(os.path.abspath(args.record)), exist_ok=True)
+    session = HeadlessSession(args.sampRate, args.channelMask, args.resolution, args.record, model,
+                              args.windowLength, args.windowOverlap, smoother=smoother, onPrediction=show_prediction,
+                              subject=args.subject, motion=args.motion, rep=args.rep, shift=args.shift)
+    GF.setEmgRawDataConfig(args.sampRate, args.channelMask, args.dataLen, args.resolution, cb=set_cmd_cb, timeout=1000)
+    GF.setDataNotifSwitch(DataNotifFlags['DNF_EMG_RAW'], set_cmd_cb, 1000)
+    session.start()
+    GF.startDataNotification(session.ondata)
+
+    t0 = time.perf_counter()
+    try:
+        while args.seconds is None or time.perf_counter() - t0 < args.seconds:
+            if replaySource and replaySource.finished.wait(args.interval):
+                # The source is done once it has handed over the last packet, but the peripheral
+                # may still hold notifications; wait until all of them reached the buffer.
+                if not session.buffer.wait_for(replaySource.sent, timeout=5):
+                    print(f"Only {session.buffer.count} of {replaySource.sent} replayed samples arrived")
+                break
+            if not replaySource:
+                time.sleep(args.interval)
+            print(format_stats(session.stats()))
+    except KeyboardInterrupt:
+        pass
+    GF.stopDataNotification()
+    GF.disconnect()
+    session.stop()
+    print(format_stats(session.stats()))
+    if session.recorder:
+        print(f"Recorded {session.recorder.writer.nSamples} samples to {session.recorder.path}")
+    if session.predictor:
+        print("Inference latency (ms): ", session.predictor.latency_stats())
+        print("Decision smoothing: ", session.predictor.smoother.latency_report())
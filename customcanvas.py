@@ -1,28 +1,38 @@
 import numpy as np
 import queue
+import time
+from collections import deque
 import matplotlib
 matplotlib.use("Qt5Agg")
 from matplotlib.pyplot import subplots
 from matplotlib.animation import TimedAnimation
 from matplotlib.lines import Line2D
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from plotmodel import FrameQueue, PlotDataModel, cue_template, time_ticks, HISTORY, CUE_WINDOW, RMS_WINDOW
 
 
-class CustomFigCanvas(FigureCanvas, TimedAnimation):
-    def __init__(self):
+class _CooperativeTimedAnimation(TimedAnimation):
+    # Qt widgets initialize cooperatively, so FigureCanvas.__init__ reaches this
+    # class without arguments first; the real set up happens in the explicit call.
+    def __init__(self, fig=None, *args, **kwargs):
+        if fig is not None:
+            TimedAnimation.__init__(self, fig, *args, **kwargs)
+
+
+class CustomFigCanvas(FigureCanvas, _CooperativeTimedAnimation):
+    def __init__(self, history=HISTORY, maxQueue=0):
         # The data
         self.scale = 20
         self.xlim = 200
         self.amplitude = 0.5
-        self.addedData = queue.Queue()
+        self.addedData = FrameQueue(maxQueue)
         self.addedLabel = queue.Queue()
+        self.frameTimes = deque(maxlen=500)
         self.timeline = np.arange(0,25,5)-25
         self.timelinex = np.arange(0,500,100)
         self.n = np.linspace(0, 299, 500)
-        self.convolemask = np.ones(15)/15
-        self.cue_line = np.zeros(500)
-        self.extra = np.arange(0,self.scale*9,self.scale)
-        self.y = np.zeros([500,9]) - self.extra
+        self.model = PlotDataModel(history, 8, self.scale)
+        self.x = np.arange(max(history, CUE_WINDOW))
 
         # The window
         self.fig, self.axes  = subplots(1,2, figsize=(8, 5))
@@ -41,13 +51,15 @@ class CustomFigCanvas(FigureCanvas, TimedAnimation):
         self.axes[1].add_line(self.line9) 
         self.axes[1].add_line(self.line10) 
         self.labels = [f'Channel {chan}' for chan in range (1,9)]
-        self.axes[0].set_xlim(0, 500)
+        self.axes[0].set_xlim(0, history)
+        self.axes[0].set_xticks(time_ticks(history)[0])
+        self.axes[0].set_xticklabels(time_ticks(history)[1])
         
         self.axes[0].set_ylim(-self.scale*9, -0)
-        self.axes[0].set_yticks(-self.extra[1:])
+        self.axes[0].set_yticks(-self.model.extra[1:])
         self.axes[0].set_yticklabels(self.labels)
 
-        self.axes[1].set_xlim(0, 500)
+        self.axes[1].set_xlim(0, CUE_WINDOW)
         self.axes[1].set_ylim(0,1.5)
         self.axes[1].set_xticks(self.timelinex)
         self.axes[1].set_xticklabels(self.timeline)
@@ -55,7 +67,7 @@ class CustomFigCanvas(FigureCanvas, TimedAnimation):
         self.axes[1].set_yticks([], minor=True)
         
         FigureCanvas.__init__(self, self.fig)
-        TimedAnimation.__init__(self, self.fig, interval = 50,repeat=True, blit = True)
+        _CooperativeTimedAnimation.__init__(self, self.fig, interval = 50,repeat=True, blit = True)
         
 
     def new_frame_seq(self):
@@ -71,7 +83,9 @@ class CustomFigCanvas(FigureCanvas, TimedAnimation):
     def _step(self, *args):
         # Extends the _step() method for the TimedAnimation class.
         try:
+            t0 = time.perf_counter()
             TimedAnimation._step(self, *args)
+            self.frameTimes.append(time.perf_counter() - t0)
         except Exception as e:
             self.abc += 1
             print(str(self.abc))
@@ -79,37 +93,40 @@ class CustomFigCanvas(FigureCanvas, TimedAnimation):
             pass
     def update_amp(self, new_val):
         self.amplitude = new_val
-        self.cue_line = np.hstack([np.zeros(540), np.linspace(0, new_val, 40), np.ones(200) * new_val,np.linspace( new_val, 0,40)  ]) # 1sec = 20
+        self.model.set_cue(cue_template(new_val))
+
+    def update_scale(self, new_val):
+        self.scale = new_val
+        self.model.set_scale(new_val)
+        self.axes[0].set_ylim(-self.scale*9, -0)
+        self.axes[0].set_yticks(-self.model.extra[1:])
+        self.axes[0].set_yticklabels(self.labels)
+        # Axis changes are not part of the blitted artists, redraw the whole figure.
+        self.draw_idle()
 
     def set_line(self, idx):
         getattr(self, f"line{idx}").set_data( self.n, range(2000))
     
-    def moving_average(self, a, n=3):
-        ret = np.cumsum(a, dtype=float)
-        ret[n:] = ret[n:] - ret[:-n]
-        return ret[n - 1:] / n
-    
     def _draw_frame(self, framedata):
         try:
-            new_data = self.addedData.get_nowait()
-            self.y = np.roll(self.y,-1,0)
-            self.cue_line = np.roll(self.cue_line,-1)
-            self.y[-1,:] = new_data
-            self.y[-1,:] -= self.extra
-            plottingdata = self.moving_average(self.y[:,0], 15)
-
+            # Everything that arrived since the last frame, as one block.
+            rows = self.addedData.drain()
+            if rows is not None:
+                self.model.push_block(rows)
         except Exception as e:
             print("Error:", type(e),e)
         
        
         try:
-            self.line0.set_data(range(400),plottingdata[86:])
+            plottingdata = self.model.rms(RMS_WINDOW)
+            traces = self.model.traces()
+            self.line0.set_data(self.x[:RMS_WINDOW],plottingdata)
             for i in range (1,9): 
-                getattr(self, f"line{i}").set_data(range(500),self.y[:,i])
-            self.line9.set_data(range(500), self.cue_line[:500])
-            self.line10.set_data(400,plottingdata[-1])
+                getattr(self, f"line{i}").set_data(self.x[:len(traces)],traces[:,i-1])
+            self.line9.set_data(self.x[:CUE_WINDOW], self.model.cue(CUE_WINDOW))
+            self.line10.set_data([RMS_WINDOW],[plottingdata[-1]])
             self.axes[1].set_ylim(-0.01, self.amplitude * 2)
             self.axes[1].set_yticks([], minor=True)
             self._drawn_artists = [getattr(self, f"line{i}") for i in range(11)]
         except Exception as e:
-            print("Error after get data",e)
\ No newline at end of file
+            print("Error after get data",e)
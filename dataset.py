@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from features import feature_bank, feature_matrix, normalize, rms, sliding_windows
+from recording import load_recording, read_markers
+from segmentation import threshold_segments
+
+CACHE_DIR = '.feature_cache'
+# Bump when the feature computation changes, so stale cache entries are not used.
+CACHE_VERSION = 1
+REST_MOTION = 9
+TRIAL_NAME = re.compile(r'Motion_(\d+)_Rep_(\d+)\.(txt|emg)$')
+META_DTYPE = np.dtype([('subject', np.int16), ('shift', np.int16), ('motion', np.int16), ('rep', np.int16)])
+
+
+def find_trials(subjectDir, shifts=None):
+    """
+    Lists the trial recordings of a subject, laid out as <subjectDir>/Shift_<n>/Motion_<m>_Rep_<r>.txt.
+
+    Args:
+        subjectDir (str): Subject directory, e.g. 'Subject_2'.
+        shifts (iterable of int): Electrode shifts to include, all found by default.
+
+    Returns:
+        list of dict: path, subject, shift, motion and rep of every trial, sorted by shift and file name.
+    """
+    numbers = re.findall(r'\d+', os.path.basename(os.path.normpath(subjectDir)))
+    if not numbers:
+        raise ValueError(f"{subjectDir}: expected a subject directory named Subject_<n>")
+    subject = int(numbers[-1])
+    if shifts is None:
+        shifts = sorted(int(name.split('_')[1]) for name in os.listdir(subjectDir) if name.startswith('Shift_'))
+    trials = []
+    for shift in shifts:
+        shiftDir = os.path.join(subjectDir, f'Shift_{shift}')
+        for name in sorted(os.listdir(shiftDir)):
+            match = TRIAL_NAME.match(name)
+            if match:
+                trials.append(dict(path=os.path.join(shiftDir, name), subject=subject, shift=shift,
+                                   motion=int(match.group(1)), rep=int(match.group(2))))
+    return trials
+
+
+def _cache_key(path, params):
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode())
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_features(path, windowLength, windowOverlap, names=('rms',), cacheDir=CACHE_DIR):
+    """
+    Computes the window features of one recording, or loads them from the cache.
+
+    Cache entries are keyed by the file content and the feature parameters, so
+    renamed or copied recordings hit the cache and edited ones do not.
+
+    Args:
+        path (str): Recording, binary or legacy text.
+        windowLength (int): Window length in samples.
+        windowOverlap (int): Overlap of consecutive windows in samples.
+        names (tuple): Features from features.FEATURES; ('rms',) gives the notebook's RMS
+            features, as float32 like normalize() (build_dataset casts to its dtype).
+        cacheDir (str): Cache directory, None disables caching.
+
+    Returns:
+        tuple (array [n_windows, n_features], array [n_windows]): Features and the summed
+        RMS of each window over all channels, used to find the active part of a trial.
+    """
+    params = dict(version=CACHE_VERSION, windowLength=windowLength, windowOverlap=windowOverlap, names=list(names))
+    cachePath = None
+    if cacheDir:
+        cachePath = os.path.join(cacheDir, _cache_key(path, params) + '.npz')
+        if os.path.exists(cachePath):
+            with np.load(cachePath) as cached:
+                return cached['features'], cached['activity']
+
+    data = normalize(load_recording(path))
+    activity = feature_matrix(data, windowLength, windowOverlap, rms)
+    if tuple(names) == ('rms',):
+        features = activity
+    else:
+        features = feature_bank(sliding_windows(data, windowLength, windowOverlap), names)
+    activity = activity.sum(1)
+
+    if cachePath:
+        os.makedirs(cacheDir, exist_ok=True)
+        # Write under a temporary name first, parallel builds may race for the same entry.
+        tmpPath = f'{cachePath}.{os.getpid()}.npz'
+        np.savez(tmpPath, features=features, activity=activity)
+        os.replace(tmpPath, cachePath)
+    return features, activity
+
+
+def _file_features(args):
+    return file_features(*args)
+
+
+def marker_windows(markers, windowLength, windowOverlap):
+    """
+    Converts the trial markers of a recording to the range of windows that lie
+    completely inside them, from the first marked start to the last marked end.
+
+    Returns:
+        tuple (int, int): Start and end (exclusive) window.
+    """
+    hop = windowLength - windowOverlap
+    start = -(-int(markers['start'].min()) // hop)
+    end = (int(markers['end'].max()) - windowLength) // hop + 1
+    return start, max(start, end)
+
+
+def build_dataset(trials, windowLength, windowOverlap, names=('rms',), cacheDir=CACHE_DIR, workers=None,
+                  dtype=np.float64, segmenter=threshold_segments):
+    """
+    Builds the training matrices from a list of trials in parallel.
+
+    Features are computed per file in a process pool (or loaded from the cache),
+    non-rest trials are trimmed to their contraction, marked in the recording by the
+    live onset detector or else found by `segmenter` in one batch, and
+    everything is copied once into preallocated arrays.
+
+    Args:
+        trials (list of dict): Trials as returned by find_trials().
+        windowLength (int): Window length in samples.
+        windowOverlap (int): Overlap of consecutive windows in samples.
+        names (tuple): Features from features.FEATURES.
+        cacheDir (str): Cache directory, None disables caching.
+        workers (int): Number of processes, all cores by default, 1 to stay in this process.
+        dtype: Type of the feature matrix.
+        segmenter (function): Maps a list of trial activities to (starts, ends) window
+            indices, see segmentation.py.
+
+    Returns:
+        tuple: features (array [n_windows, n_features]), labels (array [n_windows], motion - 1
+        as in the notebook) and meta (structured array [n_windows] with subject, shift,
+        motion and rep of each window, for splitting by rep or shift).
+    """
+    jobs = [(trial['path'], windowLength, windowOverlap, tuple(names), cacheDir) for trial in trials]
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(jobs) < 2:
+        results = list(map(_file_features, jobs))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_file_features, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+    # Rest trials are used whole, the others only from onset to offset.
+    segments = [slice(None) for _ in trials]
+    unmarked = []
+    for i, trial in enumerate(trials):
+        if trial['motion'] == REST_MOTION:
+            continue
+        markers = read_markers(trial['path'])
+        if len(markers):
+            segments[i] = slice(*marker_windows(markers, windowLength, windowOverlap))
+        else:
+            unmarked.append(i)
+    starts, ends = segmenter([results[i][1] for i in unmarked])
+    for i, start, end in zip(unmarked, starts, ends):
+        segments[i] = slice(start, end)
+    lengths = [len(range(*segment.indices(len(features)))) for segment, (features, _) in zip(segments, results)]
+
+    nFeatures = results[0][0].shape[1] if results else 0
+    X = np.empty((sum(lengths), nFeatures), dtype=dtype)
+    meta = np.empty(sum(lengths), dtype=META_DTYPE)
+    row = 0
+    for trial, segment, length, (features, _) in zip(trials, segments, lengths, results):
+        X[row:row + length] = features[segment]
+        meta[row:row + length] = (trial['subject'], trial['shift'], trial['motion'], trial['rep'])
+        row += length
+    labels = meta['motion'] - 1.0
+    return X, labels, meta
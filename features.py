@@ -0,0 +1,276 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Raw 8-bit samples idle around OFFSET; features are computed on (raw - OFFSET) / SCALE.
+OFFSET = 121
+SCALE = 255.0
+
+
+def normalize(raw, offset=OFFSET, scale=SCALE):
+    """
+    Converts raw samples to zero-centred float32 values.
+
+    Args:
+        raw (array [n_samples, n_channels]): Raw samples as decoded from the device.
+        offset (float): Idle level of the raw samples.
+        scale (float): Full-scale value.
+
+    Returns:
+        array [n_samples, n_channels]: The normalized samples.
+    """
+    return (np.asarray(raw, dtype=np.float32) - offset) / scale
+
+
+def sliding_windows(data, windowLength, windowOverlap):
+    """
+    Returns all complete windows of a recording as a strided view, without copying.
+
+    Args:
+        data (array [n_samples, n_channels]): The samples.
+        windowLength (int): Window length in samples.
+        windowOverlap (int): Overlap of consecutive windows in samples.
+
+    Returns:
+        array [n_windows, n_channels, windowLength]: The windows, window i starting
+        at sample i*(windowLength-windowOverlap).
+    """
+    hop = windowLength - windowOverlap
+    if len(data) < windowLength:
+        return np.zeros([0, data.shape[1], windowLength], dtype=data.dtype)
+    return sliding_window_view(data, windowLength, axis=0)[::hop]
+
+
+def rms(windows):
+    """Root mean square over the last (samples) axis."""
+    return np.sqrt(np.mean(np.square(windows), axis=-1))
+
+
+def mean(windows):
+    """Mean over the last (samples) axis."""
+    return np.mean(windows, axis=-1)
+
+
+def feature_matrix(data, windowLength, windowOverlap, feature=rms):
+    """
+    Computes a windowed feature for all channels and windows of a recording at once.
+
+    Only complete windows are used, so a recording of n samples gives
+    (n - windowLength) // (windowLength - windowOverlap) + 1 windows.
+
+    Args:
+        data (array [n_samples, n_channels]): Normalized samples.
+        windowLength (int): Window length in samples.
+        windowOverlap (int): Overlap of consecutive windows in samples.
+        feature (function): Maps [..., samples] windows to [...] features.
+
+    Returns:
+        array [n_windows, n_channels]: The feature of every window and channel.
+    """
+    return feature(sliding_windows(data, windowLength, windowOverlap))
+
+
+class StreamingFeatures():
+    """
+    Computes the same windowed feature as feature_matrix() on a live stream.
+
+    Samples are fed in blocks of any size; every window completed by a block is
+    returned once, so concatenating the outputs of update() over a recording gives
+    exactly feature_matrix() of the whole recording.
+
+    Methods:
+        update(block): Adds samples and returns the features of newly completed windows.
+    """
+    def __init__(self, nChannels, windowLength, windowOverlap, feature=rms):
+        """
+        Args:
+            nChannels (int): Number of channels per sample.
+            windowLength (int): Window length in samples.
+            windowOverlap (int): Overlap of consecutive windows in samples.
+            feature (function): Maps [..., samples] windows to [...] features.
+        """
+        self.windowLength = windowLength
+        self.windowOverlap = windowOverlap
+        self.hop = windowLength - windowOverlap
+        self.feature = feature
+        self._pending = np.zeros([0, nChannels], dtype=np.float32)
+
+    def update(self, block):
+        """
+        Args:
+            block (array [n_samples, n_channels]): New normalized samples, oldest first.
+
+        Returns:
+            array [n_windows, n_channels]: Features of the windows completed by this block.
+        """
+        data = np.concatenate([self._pending, block])
+        out = feature_matrix(data, self.windowLength, self.windowOverlap, self.feature)
+        # Keep everything from the start of the next, still incomplete window.
+        self._pending = data[len(out) * self.hop:]
+        return out
+
+
+class RunningWindowStats():
+    """
+    Mean and RMS of the last `windowLength` samples, updated in O(hop) per window.
+
+    Keeps per-channel running sums and sums of squares of the raw integer samples:
+    new samples are added and the samples that drop out of the window are
+    subtracted, so the cost of a window update does not depend on its length.
+    Integer sums are exact, there is no floating-point drift however long it runs.
+
+    Methods:
+        push(block): Adds raw samples, expiring the oldest ones.
+        update(start, window): Moves to the window starting at `start`, adding only its new samples.
+        reset(): Forgets all samples.
+        mean(): Mean of (raw - offset) / scale over the window, per channel.
+        rms(): RMS of (raw - offset) / scale over the window, per channel.
+    """
+    def __init__(self, nChannels, windowLength, offset=OFFSET, scale=SCALE):
+        """
+        Args:
+            nChannels (int): Number of channels per sample.
+            windowLength (int): Window length in samples.
+            offset (float): Idle level of the raw samples.
+            scale (float): Full-scale value.
+        """
+        self.windowLength = windowLength
+        self.offset = offset
+        self.scale = scale
+        self._history = np.zeros([windowLength, nChannels], dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        self._history[:] = 0
+        self._pos = 0
+        self.count = 0
+        self.start = None
+        self._sum = np.zeros(self._history.shape[1], dtype=np.int64)
+        self._sumsq = np.zeros(self._history.shape[1], dtype=np.int64)
+
+    def push(self, block):
+        """
+        Args:
+            block (array [n_samples, n_channels]): New raw integer samples, oldest first.
+        """
+        block = np.asarray(block, dtype=np.int64)[-self.windowLength:]
+        k = len(block)
+        # Slots not filled yet are zero, so expiring them subtracts nothing.
+        idx = (self._pos + np.arange(k)) % self.windowLength
+        expired = self._history[idx]
+        self._sum += block.sum(0) - expired.sum(0)
+        self._sumsq += (block * block).sum(0) - (expired * expired).sum(0)
+        self._history[idx] = block
+        self._pos = (self._pos + k) % self.windowLength
+        self.count = min(self.count + k, self.windowLength)
+
+    def update(self, start, window):
+        """
+        Args:
+            start (int): Absolute index of the first sample of the window.
+            window (array [windowLength, n_channels]): Raw samples of the window, e.g. from WindowEngine.
+        """
+        if self.start is not None and start - self.start < self.windowLength:
+            # Only the samples after the previous window are new.
+            self.push(window[self.start - start:])
+        else:
+            self.reset()
+            self.push(window)
+        self.start = start
+
+    def mean(self):
+        return (self._sum / self.count - self.offset) / self.scale
+
+    def rms(self):
+        n, o = self.count, self.offset
+        meansq = (self._sumsq - 2 * o * self._sum) / n + o * o
+        return np.sqrt(np.maximum(meansq, 0)) / self.scale
+
+
+# Feature bank in the style of the Hudgins time-domain set plus Hjorth parameters and
+# AR coefficients. Values per channel: 1 for each feature, 3 for 'hjorth'
+# (activity, mobility, complexity) and arOrder for 'ar'.
+FEATURES = ('rms', 'mav', 'wl', 'zc', 'ssc', 'hjorth', 'ar')
+
+
+def feature_names(names=FEATURES, nChannels=8, arOrder=4):
+    """
+    Returns the column names of feature_bank() output, e.g. 'wl_ch3' or 'ar2_ch1'.
+    """
+    columns = []
+    for name in names:
+        if name == 'hjorth':
+            parts = ['activity', 'mobility', 'complexity']
+        elif name == 'ar':
+            parts = [f'ar{k}' for k in range(1, arOrder + 1)]
+        else:
+            parts = [name]
+        columns += [f'{part}_ch{ch}' for part in parts for ch in range(1, nChannels + 1)]
+    return columns
+
+
+def _ar_coefficients(x, order):
+    # Yule-Walker estimate for all windows and channels at once; x is zero-mean.
+    length = x.shape[-1]
+    r = np.stack([np.einsum('...i,...i->...', x[..., :length - k], x[..., k:])
+                  for k in range(order + 1)], axis=-1) / length
+    lags = np.abs(np.arange(order)[:, None] - np.arange(order)[None, :])
+    toeplitz = r[..., lags]
+    # Flat (all-constant) windows would make the system singular.
+    toeplitz += 1e-9 * np.eye(order)
+    return np.linalg.solve(toeplitz, r[..., 1:, None])[..., 0]
+
+
+def feature_bank(windows, names=FEATURES, arOrder=4, threshold=0.0):
+    """
+    Computes a set of EMG features for all windows and channels in one vectorized pass.
+
+    Intermediate results (differences, absolute values, variances) are shared
+    between features, so asking for several features costs little more than one.
+
+    Args:
+        windows (array [n_windows, n_channels, windowLength]): Normalized windows,
+            e.g. from sliding_windows().
+        names (tuple): Features to compute, any subset of FEATURES, in output order.
+        arOrder (int): Number of AR coefficients for 'ar'.
+        threshold (float): Minimum amplitude step counted by 'zc' and 'ssc', to ignore noise.
+
+    Returns:
+        array [n_windows, n_features]: Columns grouped by feature, then by channel,
+        see feature_names().
+    """
+    unknown = set(names) - set(FEATURES)
+    if unknown:
+        raise ValueError(f"unknown features {sorted(unknown)}, choose from {FEATURES}")
+
+    x = np.asarray(windows, dtype=np.float32)
+    dx = np.diff(x, axis=-1)
+    out = []
+    var = None
+    for name in names:
+        if name == 'rms':
+            out.append(rms(x))
+        elif name == 'mav':
+            out.append(np.mean(np.abs(x), axis=-1))
+        elif name == 'wl':
+            out.append(np.sum(np.abs(dx), axis=-1))
+        elif name == 'zc':
+            crossing = (x[..., :-1] * x[..., 1:] < 0) & (np.abs(dx) >= threshold)
+            out.append(np.count_nonzero(crossing, axis=-1).astype(np.float32))
+        elif name == 'ssc':
+            turn = (dx[..., :-1] * dx[..., 1:] < 0) & \
+                   (np.maximum(np.abs(dx[..., :-1]), np.abs(dx[..., 1:])) >= threshold)
+            out.append(np.count_nonzero(turn, axis=-1).astype(np.float32))
+        elif name == 'hjorth':
+            if var is None:
+                var = np.var(x, axis=-1)
+            dvar = np.var(dx, axis=-1)
+            ddvar = np.var(np.diff(dx, axis=-1), axis=-1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mobility = np.sqrt(dvar / var)
+                complexity = np.sqrt(ddvar / dvar) / mobility
+            out += [var, np.nan_to_num(mobility), np.nan_to_num(complexity)]
+        elif name == 'ar':
+            centred = x - np.mean(x, axis=-1, keepdims=True)
+            coefs = _ar_coefficients(centred.astype(np.float64), arOrder).astype(np.float32)
+            out += [coefs[..., k] for k in range(arOrder)]
+    return np.concatenate(out, axis=-1)
@@ -1,14 +1,20 @@
 # !/usr/bin/python
 # -*- coding:utf-8 -*-
 
-from bluepy import btle
-from bluepy.btle import DefaultDelegate, Scanner, Peripheral
+try:
+    from bluepy.btle import DefaultDelegate, Scanner, Peripheral
+except ImportError:
+    # The packet decoding below works without bluepy, e.g. when replaying
+    # recordings on a machine without Bluetooth; only connecting needs it.
+    DefaultDelegate = object
+    Peripheral = Scanner = None
 from datetime import datetime, timedelta
 import struct
 from enum import Enum
 import threading
 import time
 import queue
+import numpy as np
 
 
 class GF_RET_CODE(Enum):
@@ -221,7 +227,37 @@ class CommandCallbackTableEntry():
         self._cb = _cb
 
 
-class MyDelegate(btle.DefaultDelegate):
+class EmgRawDataDecoder():
+    """
+    Decodes full NTF_EMG_ADC_DATA packets into [n_samples, n_channels] arrays.
+
+    The payload after the type byte holds the samples of all enabled channels
+    interleaved, one byte per channel at 8-bit resolution and two bytes in LSB
+    order at 12-bit resolution. Decoding is a single np.frombuffer call, so no
+    per-sample Python work is done.
+    """
+    def __init__(self, channelMask=0xFF, resolution=8):
+        self.channelMask = channelMask
+        self.resolution = resolution
+        self.nChannels = bin(channelMask & 0xFFFF).count('1')
+        self.dtype = np.dtype(np.uint8) if resolution == 8 else np.dtype('<u2')
+        self.sampleSize = self.nChannels * self.dtype.itemsize
+
+    def decode(self, packet):
+        # Reassembled partial packets come as a list of ints
+        if not isinstance(packet, (bytes, bytearray, memoryview)):
+            packet = bytes(packet)
+
+        if len(packet) < 1 or packet[0] != NotifDataType['NTF_EMG_ADC_DATA']:
+            return np.empty([0, self.nChannels], dtype=self.dtype)
+
+        # A truncated trailing sample (lost partial packet) is dropped
+        nSamples = (len(packet) - 1) // self.sampleSize
+        return np.frombuffer(packet, dtype=self.dtype, count=nSamples * self.nChannels,
+                             offset=1).reshape(nSamples, self.nChannels)
+
+
+class MyDelegate(DefaultDelegate):
     def __init__(self, gforce):
         super().__init__()
         self.gforce = gforce
@@ -234,7 +270,9 @@ class MyDelegate(btle.DefaultDelegate):
             if not self.gforce.send_queue.empty():
                 cmd = self.gforce.send_queue.get_nowait()
                 self.gforce.cmdCharacteristic.write(cmd)
-            self.gforce.device.waitForNotifications(1)
+            # Commands queued meanwhile are only written after the wait, keep it
+            # short so they do not time out while the device is silent.
+            self.gforce.device.waitForNotifications(0.05)
 
     def handleNotification(self, cHandle, data):
         # check cHandle
@@ -249,8 +287,23 @@ class MyDelegate(btle.DefaultDelegate):
 
 
 class GForceProfile():
-    def __init__(self):
-        self.device = Peripheral()
+    """
+    Host side of the gForce armband protocol.
+
+    The Bluetooth transport is anything with the bluepy Peripheral and Scanner
+    interface, so the profile runs unchanged against simdevice.SimulatedPeripheral
+    and SimulatedScanner when no armband or adapter is available.
+    """
+    def __init__(self, peripheral=None, scanner=None):
+        """
+        Args:
+            peripheral: Transport for the connection, a new bluepy Peripheral by default.
+            scanner: Device scanner, a new bluepy Scanner by default.
+        """
+        if (peripheral is None or scanner is None) and Peripheral is None:
+            raise ImportError("bluepy is needed to connect to the armband, or pass a simulated peripheral and scanner")
+        self.device = peripheral if peripheral is not None else Peripheral()
+        self.scanner = scanner if scanner is not None else Scanner()
         self.state = BluetoothDeviceState.disconnected
         self.cmdCharacteristic = None
         self.notifyCharacteristic = None
@@ -263,6 +316,7 @@ class GForceProfile():
         self.incompleteNotifPacket = []
         self.lastIncompleteNotifPacketId = 0
         self.onData = None
+        self.emgDecoder = EmgRawDataDecoder()
         self.lock = threading.Lock()
         self.send_queue = queue.Queue(maxsize=20)
 
@@ -301,8 +355,7 @@ class GForceProfile():
     # Connect the bracelet with the strongest signal
 
     def connectByRssi(self):
-        scanner = Scanner()
-        devices = scanner.scan(10.0)
+        devices = self.scanner.scan(10.0)
         rssi_devices = {}
 
         for dev in devices:
@@ -351,8 +404,7 @@ class GForceProfile():
             setup_handle, setup_data, withResponse=False)
 
     def scan(self, timeout):
-        scanner = Scanner()
-        devices = scanner.scan(timeout,passive=True)
+        devices = self.scanner.scan(timeout,passive=True)
 
         gforce_scan = []
         i = 1
@@ -488,6 +540,7 @@ class GForceProfile():
         data += struct.pack('<B', dataLen)
         data += struct.pack('<B', resolution)
         print(data)
+        self.emgDecoder = EmgRawDataDecoder(channelMask, resolution)
         def temp(resp, raspData):
             if cb != None:
                 cb(resp)
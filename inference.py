@@ -0,0 +1,204 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+import numpy as np
+
+# Models written by the training notebook, next to GUI.py. The plain NumPy export
+# is preferred, it loads without importing scikit-learn.
+MODEL_PATH = 'LogisticRegression.npz'
+JOBLIB_MODEL_PATH = 'LogisticRegression.joblib'
+
+
+class LinearPredictor():
+    """
+    Dependency-free runtime for linear classifiers exported by export_linear_model().
+
+    Prediction is one matrix product plus a softmax or sigmoid, with none of the
+    input validation scikit-learn does on every call.
+
+    Attributes:
+        coef (array [n_classes, n_features]): Weights, a single row for binary models.
+        intercept (array [n_classes]): Biases.
+        classes_ (array [n_classes]): Class labels, as in scikit-learn.
+        kind (str): 'softmax' (multinomial), 'ovr' (one-vs-rest) or 'binary'.
+    """
+    def __init__(self, coef, intercept, classes, kind='softmax'):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.classes_ = np.asarray(classes)
+        self.kind = kind
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f['coef'], f['intercept'], f['classes'], str(f['kind']))
+
+    def decision_function(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef.T + self.intercept
+
+    def predict_proba(self, X):
+        scores = self.decision_function(X)
+        if self.kind == 'softmax':
+            scores = np.exp(scores - scores.max(1, keepdims=True))
+            return scores / scores.sum(1, keepdims=True)
+        proba = 1 / (1 + np.exp(-scores))
+        if self.kind == 'binary':
+            return np.hstack([1 - proba, proba])
+        return proba / proba.sum(1, keepdims=True)
+
+    def predict(self, X):
+        scores = self.decision_function(X)
+        if self.kind == 'binary':
+            return self.classes_[(scores[:, 0] > 0).astype(int)]
+        return self.classes_[scores.argmax(1)]
+
+
+def export_linear_model(model, path=MODEL_PATH):
+    """
+    Writes the weights of a fitted scikit-learn linear classifier (e.g. LogisticRegression)
+    to an .npz file that LinearPredictor can load without scikit-learn.
+
+    Args:
+        model: Fitted classifier with coef_, intercept_ and classes_.
+        path (str): Path of the .npz file.
+    """
+    coef = np.atleast_2d(model.coef_)
+    if coef.shape[0] == 1:
+        kind = 'binary'
+    elif getattr(model, 'multi_class', 'auto') == 'ovr' or getattr(model, 'solver', None) == 'liblinear':
+        kind = 'ovr'
+    else:
+        kind = 'softmax'
+    np.savez(path, coef=coef, intercept=np.atleast_1d(model.intercept_),
+             classes=np.asarray(model.classes_), kind=np.array(kind))
+
+
+def load_model(path=None):
+    """
+    Loads a classifier with predict_proba() and classes_.
+
+    Args:
+        path (str): An .npz export (loaded as LinearPredictor) or a joblib file.
+            By default MODEL_PATH is used if it exists, JOBLIB_MODEL_PATH otherwise.
+
+    Returns:
+        The classifier.
+    """
+    if path is None:
+        path = MODEL_PATH if os.path.exists(MODEL_PATH) else JOBLIB_MODEL_PATH
+    if path.endswith('.npz'):
+        return LinearPredictor.load(path)
+    # joblib pulls in scikit-learn, only pay for it when such a model is actually needed
+    from joblib import load
+    return load(path)
+
+
+class InferenceWorker():
+    """
+    Classifies feature windows on a dedicated thread, in micro-batches.
+
+    Windows are submitted from the data loop without blocking. The worker takes
+    everything queued (up to `maxBatch` windows) and runs a single predict_proba
+    call on it, so the per-call overhead of the model is shared when it falls behind.
+
+    Attributes:
+        model: Classifier with predict_proba() and classes_.
+        smoother (DecisionSmoother): Optional post-processing of the decisions.
+        latencies (deque): End-to-end latency of the last predictions in seconds,
+            from submit() to the prediction being published.
+        dropped (int): Windows discarded because the queue was full.
+
+    Methods:
+        submit(features, timestamp): Queues a feature vector for classification.
+        latency_stats(): Returns latency percentiles in milliseconds.
+        stop(): Stops the worker thread.
+    """
+    def __init__(self, model, onPrediction, maxBatch=16, maxsize=64, smoother=None):
+        """
+        Starts the worker thread.
+
+        Args:
+            model: Classifier with predict_proba() and classes_.
+            onPrediction (function): Called as onPrediction([label, confidence, latency])
+                for every window, from the worker thread.
+            maxBatch (int): Maximum number of windows per predict_proba call.
+            maxsize (int): Maximum number of queued windows.
+            smoother (DecisionSmoother): Applied to every decision before it is published.
+        """
+        self.model = model
+        self.smoother = smoother
+        self.onPrediction = onPrediction
+        self.maxBatch = maxBatch
+        self.dropped = 0
+        self.latencies = deque(maxlen=1000)
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.thread = threading.Thread(name='inferenceWorker', target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, features, timestamp=None, rms=None):
+        """
+        Queues one feature vector. Never blocks; the window is dropped if the queue is full.
+
+        Args:
+            features (array [n_features]): Features of one window.
+            timestamp (float): time.perf_counter() when the window's data was
+                available, defaults to now.
+            rms (float): Summed RMS of the window, for the smoother's rest gate.
+        """
+        try:
+            self.queue.put_nowait((features, timestamp or time.perf_counter(), rms))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.maxBatch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is None for item in batch)
+            batch = [item for item in batch if item is not None]
+            if batch:
+                try:
+                    self._predict(batch)
+                except Exception as e:
+                    print("Error during inference:", type(e), e)
+            if stop:
+                return
+
+    def _predict(self, batch):
+        proba = self.model.predict_proba(np.stack([features for features, _, _ in batch]))
+        best = proba.argmax(1)
+        labels = np.asarray(self.model.classes_)[best]
+        confidences = proba[np.arange(len(best)), best]
+        for (_, timestamp, rms), label, confidence in zip(batch, labels, confidences):
+            if self.smoother:
+                label, confidence = self.smoother.update(label, confidence, rms)
+                if label is None:
+                    continue
+            latency = time.perf_counter() - timestamp
+            self.latencies.append(latency)
+            self.onPrediction([label, float(confidence), latency])
+
+    def latency_stats(self):
+        """
+        Returns:
+            dict: 50th/95th/99th percentile and maximum latency in milliseconds,
+            empty if nothing was predicted yet.
+        """
+        if not self.latencies:
+            return {}
+        ms = np.array(self.latencies) * 1000
+        return dict(p50=np.percentile(ms, 50), p95=np.percentile(ms, 95),
+                    p99=np.percentile(ms, 99), max=ms.max())
+
+    def stop(self):
+        """
+        Lets the worker finish the queued windows and waits for it to exit.
+        """
+        self.queue.put(None)
+        self.thread.join()
@@ -0,0 +1,91 @@
+import time
+from collections import deque
+import numpy as np
+import pyqtgraph as pg
+from PyQt5 import QtCore
+from plotmodel import FrameQueue, PlotDataModel, cue_template, time_ticks, HISTORY, CUE_WINDOW, RMS_WINDOW
+
+
+class PgFigCanvas(pg.GraphicsLayoutWidget):
+    """
+    pyqtgraph version of CustomFigCanvas with the same public API.
+
+    Curves are PlotDataItems updated with setData on views of the PlotDataModel
+    ring, with clip-to-view and peak downsampling enabled, so a frame costs a
+    fraction of a matplotlib blit.
+
+    Methods:
+        addData(value): Queues [rms, ch1..ch8] for the next frame; all queued rows are drawn at once.
+        update_amp(new_val): Sets the MVC cue amplitude.
+        update_scale(new_val): Sets the vertical spacing of the channel traces.
+    """
+    def __init__(self, history=HISTORY, interval=50, maxQueue=0):
+        super().__init__()
+        # The data
+        self.scale = 20
+        self.amplitude = 0.5
+        self.addedData = FrameQueue(maxQueue)
+        self.frameTimes = deque(maxlen=500)
+        self.timeline = np.arange(0,25,5)-25
+        self.timelinex = np.arange(0,500,100)
+        self.model = PlotDataModel(history, 8, self.scale)
+        self.x = np.arange(max(history, CUE_WINDOW))
+        self.labels = [f'Channel {chan}' for chan in range (1,9)]
+
+        # The window
+        self.axes = [self.addPlot(row=0, col=0), self.addPlot(row=0, col=1)]
+        for ax in self.axes:
+            ax.setClipToView(True)
+            ax.setDownsampling(auto=True, mode='peak')
+            ax.setMouseEnabled(False, False)
+            ax.hideButtons()
+        self.axes[0].setXRange(0, history, padding=0)
+        self.axes[1].setXRange(0, CUE_WINDOW, padding=0)
+
+        self.lines = [self.axes[0].plot(pen=pg.intColor(i, 8)) for i in range(8)]
+        self.rmsLine = self.axes[1].plot(pen='w')
+        self.cueLine = self.axes[1].plot(pen=pg.mkPen(255, 0, 0, 80))
+        self.marker = self.axes[1].plot(pen=None, symbol='o', symbolSize=10, symbolBrush='r')
+
+        self.axes[0].getAxis('bottom').setTicks([list(zip(*time_ticks(history)))])
+        self.axes[1].getAxis('bottom').setTicks([list(zip(self.timelinex, map(str, self.timeline)))])
+        self.axes[1].getAxis('left').setTicks([[]])
+        self._set_channel_axis()
+        self.axes[1].setYRange(-0.01, self.amplitude * 2, padding=0)
+
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self._draw_frame)
+        self.timer.start(interval)
+
+    def _set_channel_axis(self):
+        self.axes[0].setYRange(-self.scale*9, 0, padding=0)
+        self.axes[0].getAxis('left').setTicks([list(zip(-self.model.extra[1:], self.labels))])
+
+    def addData(self, value):
+        self.addedData.put(value)
+
+    def update_amp(self, new_val):
+        self.amplitude = new_val
+        self.model.set_cue(cue_template(new_val))
+        self.axes[1].setYRange(-0.01, self.amplitude * 2, padding=0)
+
+    def update_scale(self, new_val):
+        self.scale = new_val
+        self.model.set_scale(new_val)
+        self._set_channel_axis()
+
+    def _draw_frame(self):
+        t0 = time.perf_counter()
+        rows = self.addedData.drain()
+        if rows is None:
+            return
+        self.model.push_block(rows)
+
+        plottingdata = self.model.rms(RMS_WINDOW)
+        traces = self.model.traces()
+        for i in range(8):
+            self.lines[i].setData(self.x[:len(traces)], traces[:,i], skipFiniteCheck=True)
+        self.rmsLine.setData(self.x[:RMS_WINDOW], plottingdata, skipFiniteCheck=True)
+        self.cueLine.setData(self.x[:CUE_WINDOW], self.model.cue(CUE_WINDOW), skipFiniteCheck=True)
+        self.marker.setData([RMS_WINDOW], [plottingdata[-1]])
+        self.frameTimes.append(time.perf_counter() - t0)
@@ -0,0 +1,231 @@
+import queue
+import time
+from collections import deque
+import numpy as np
+
+# The plot gets one row per feature window: 20 rows/s at 500 Hz with a 25-sample hop.
+ROWS_PER_SECOND = 20
+# Channel traces show 3 minutes, the rms/cue panel 25 s with "now" 5 s before its right edge.
+HISTORY = 180 * ROWS_PER_SECOND
+CUE_WINDOW = 500
+RMS_WINDOW = 400
+
+
+def cue_template(amplitude):
+    """
+    One period of the MVC cue line: rest, 2 s ramp up, 10 s hold at `amplitude`, 2 s ramp down.
+    """
+    return np.hstack([np.zeros(540), np.linspace(0, amplitude, 40), np.ones(200) * amplitude,np.linspace( amplitude, 0,40)  ]) # 1sec = 20
+
+
+def time_ticks(n, step=30):
+    """
+    Returns (positions, labels) for an axis of n rows ending now, one tick every `step` seconds.
+    """
+    positions = np.arange(n, -1, -step*ROWS_PER_SECOND)[::-1]
+    return positions, [f"{(x - n) // ROWS_PER_SECOND}" for x in positions]
+
+
+def decimate_minmax(data, nColumns, start=0):
+    """
+    Reduces a sample block to a minimum and a maximum per display column, so a
+    line plot of the result looks like the full-rate signal but has 2*nColumns
+    points whatever the sample rate.
+
+    Column boundaries are aligned to absolute sample indices, so a scrolling plot
+    does not flicker when the same samples land in different columns; samples
+    before the first full column and after the last one are left out.
+
+    Args:
+        data (array [n_samples, n_channels]): Samples, oldest first.
+        nColumns (int): Number of display columns, e.g. the plot width in pixels.
+        start (int): Absolute index of the first sample in `data`.
+
+    Returns:
+        tuple: (x, y) with x (array [2*columns]) the absolute index of each column's
+        first sample, repeated for its min and max, and y (array [2*columns, n_channels])
+        the alternating minima and maxima. Data that already fits is returned as is.
+    """
+    n = len(data)
+    if n <= 2 * nColumns:
+        return np.arange(start, start + n), data
+    perColumn = -(-n // nColumns)
+    skip = -start % perColumn
+    columns = (n - skip) // perColumn
+    blocks = data[skip:skip + columns * perColumn].reshape(columns, perColumn, -1)
+    y = np.empty((columns, 2, blocks.shape[2]), dtype=data.dtype)
+    blocks.min(1, out=y[:, 0])
+    blocks.max(1, out=y[:, 1])
+    x = np.repeat(start + skip + np.arange(columns) * perColumn, 2)
+    return x, y.reshape(2 * columns, -1)
+
+
+class FrameQueue():
+    """
+    Hand-over of plot rows from the data thread to the canvas.
+
+    The canvas drains everything pending on each frame instead of one row per
+    tick, so the display can not fall behind a producer faster than the frame
+    rate. With `maxsize` set, the oldest rows are dropped when the canvas stalls.
+
+    Attributes:
+        maxsize (int): Maximum number of pending rows, 0 for no limit.
+        dropped (int): Rows discarded because the queue was full.
+        depths (deque): Number of rows drained on each of the last frames.
+        lags (deque): Age in seconds of the oldest row drained on each of the last frames.
+
+    Methods:
+        put(value): Queues one [rms, ch1..chN] row, called from the data thread.
+        drain(): Returns all pending rows as one array, None if there are none.
+        stats(): Returns queue depth and display lag percentiles.
+    """
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.depths = deque(maxlen=1000)
+        self.lags = deque(maxlen=1000)
+        self._queue = queue.Queue()
+
+    def put(self, value):
+        if self.maxsize and self._queue.qsize() >= self.maxsize:
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+        self._queue.put((time.perf_counter(), value))
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def drain(self):
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not items:
+            return None
+        self.depths.append(len(items))
+        self.lags.append(time.perf_counter() - items[0][0])
+        return np.array([value for _, value in items], dtype=float)
+
+    def stats(self):
+        """
+        Returns:
+            dict: 50th/95th percentile and maximum of the rows drained per frame and
+            of the display lag in milliseconds, plus the number of dropped rows.
+        """
+        report = dict(dropped=self.dropped)
+        if self.depths:
+            depths, lags = np.array(self.depths), np.array(self.lags) * 1000
+            report.update(depth_p50=np.percentile(depths, 50), depth_p95=np.percentile(depths, 95),
+                          depth_max=depths.max(), lag_p50_ms=np.percentile(lags, 50),
+                          lag_p95_ms=np.percentile(lags, 95), lag_max_ms=lags.max())
+        return report
+
+
+class PlotDataModel():
+    """
+    Data behind the plotting canvases: a write-pointer ring of [rms, ch1..chN] rows.
+
+    Every row is written twice, at its slot and one history length further, so the
+    last `history` rows are always one contiguous slice, oldest first, and can be
+    handed to the plot without np.roll or any copy. The moving average of the rms
+    column is computed for new rows only, from a cumulative sum that
+    continues over the last `smooth` stored values, and the cue line scrolls by
+    moving an offset into a doubled template. Pushing rows costs the same
+    whatever the history length, and a block of rows is applied at once.
+
+    Attributes:
+        history (int): Number of rows kept and shown.
+        scale (float): Vertical distance between channel traces.
+        smooth (int): Length of the rms moving average.
+
+    Methods:
+        push(row): Appends one [rms, ch1..chN] row.
+        push_block(rows): Appends an [n, 1+nChannels] block of rows.
+        traces(n): Last n rows of the channel columns, shifted apart by `scale`.
+        rms(n): Last n values of the smoothed rms.
+        cue(n): Current n points of the scrolling cue line.
+        set_cue(template): Restarts the cue line with a new template.
+        set_scale(scale): Changes the distance between channel traces.
+    """
+    def __init__(self, history=HISTORY, nChannels=8, scale=20, smooth=15):
+        """
+        Args:
+            history (int): Number of rows kept, e.g. 3600 for 3 minutes at 20 rows/s.
+            nChannels (int): Number of channel columns after the rms column.
+            scale (float): Vertical distance between channel traces.
+            smooth (int): Length of the rms moving average.
+        """
+        self.history = history
+        self.smooth = smooth
+        self.scale = scale
+        self.extra = np.arange(0, scale*(nChannels+1), scale)
+        self._y = np.zeros([2*history, nChannels+1]) - self.extra
+        self._smoothed = np.zeros(2*history)
+        self._pos = 0
+        self.set_cue(np.zeros(CUE_WINDOW))
+
+    def push(self, row):
+        """
+        Args:
+            row (array [1+nChannels]): Summed rms followed by the per-channel values.
+        """
+        self.push_block(np.asarray(row)[None])
+
+    def push_block(self, rows):
+        """
+        Appends several rows with one vectorized update.
+
+        Args:
+            rows (array [n, 1+nChannels]): Rows in arrival order. Only the last
+                `history` are stored if more arrive at once.
+        """
+        rows = np.asarray(rows, dtype=float)
+        n, h = len(rows), self.history
+        if n == 0:
+            return
+        # Moving average of the new rms values, continuing from the last `smooth` stored ones.
+        rmsSeries = np.concatenate([self._y[self._pos + h - self.smooth:self._pos + h, 0], rows[:, 0] - self.extra[0]])
+        cumsum = np.concatenate([[0.0], np.cumsum(rmsSeries)])
+        smoothed = (cumsum[self.smooth + 1:] - cumsum[1:n + 1]) / self.smooth
+
+        keep = min(n, h)
+        slots = (self._pos + n - keep + np.arange(keep)) % h
+        self._y[slots] = self._y[slots + h] = rows[n - keep:] - self.extra
+        self._smoothed[slots] = self._smoothed[slots + h] = smoothed[n - keep:]
+        self._pos = (self._pos + n) % h
+        self._cueOffset = (self._cueOffset + n) % self._cueLength
+
+    def traces(self, n=None):
+        """
+        Returns a view into the ring, oldest first, which the canvases plot as is every
+        frame; rms() and cue() are views in the same way.
+        """
+        n = n or self.history
+        return self._y[self._pos + self.history - n:self._pos + self.history, 1:]
+
+    def rms(self, n=None):
+        n = n or self.history
+        return self._smoothed[self._pos + self.history - n:self._pos + self.history]
+
+    def cue(self, n):
+        return self._cue[self._cueOffset:self._cueOffset + n]
+
+    def set_cue(self, template):
+        """
+        Args:
+            template (array): One period of the cue line, at least as long as any cue(n) view.
+        """
+        self._cueLength = len(template)
+        self._cue = np.concatenate([template, template])
+        self._cueOffset = 0
+
+    def set_scale(self, scale):
+        extra = np.arange(0, scale*len(self.extra), scale)
+        self._y += self.extra - extra
+        self.scale = scale
+        self.extra = extra
@@ -0,0 +1,128 @@
+from collections import Counter, deque
+import numpy as np
+
+
+class DecisionSmoother():
+    """
+    Post-processing of per-window classifications before they drive the hand.
+
+    Each raw decision goes through three optional stages:
+        1. rest gate: windows whose summed RMS is below restFactor times the rest
+           level are forced to `restLabel`. The rest level is set explicitly or
+           estimated, as in the training notebook, from the mean RMS of the last
+           `restHistory` windows the classifier called rest.
+        2. confidence threshold: decisions below `minConfidence` are ignored and
+           the previous label is kept.
+        3. majority vote over the last `voteWindow` decisions.
+
+    Attributes:
+        hop (float): Time between windows in seconds, used for latency figures.
+        restLevel (float): Current rest RMS level, None until known.
+
+    Methods:
+        update(label, confidence, rms): Returns the smoothed (label, confidence).
+        added_latency(): Expected extra delay of the current settings in seconds.
+        latency_report(): Expected and measured delays and label-switch counts.
+    """
+    def __init__(self, voteWindow=5, minConfidence=0.0, restLabel=8, restFactor=2.0, restHistory=50,
+                 restLevel=None, hop=0.05):
+        """
+        Args:
+            voteWindow (int): Number of decisions in the majority vote, 1 disables it.
+            minConfidence (float): Minimum classifier probability, 0 disables the threshold.
+            restLabel: Label of the rest class, None disables the rest gate.
+            restFactor (float): Gate threshold as a multiple of the rest level.
+            restHistory (int): Number of rest windows averaged for the rest level.
+            restLevel (float): Fixed rest RMS level, estimated from the stream if None.
+            hop (float): Time between windows in seconds.
+        """
+        self.voteWindow = voteWindow
+        self.minConfidence = minConfidence
+        self.restLabel = restLabel
+        self.restFactor = restFactor
+        self.restLevel = restLevel
+        self.fixedRestLevel = restLevel is not None
+        self.hop = hop
+        self._restRms = deque(maxlen=restHistory)
+        self._votes = deque(maxlen=voteWindow)
+        self._held = None
+        self._output = None
+        self._rawLabel = None
+        self._rawSince = 0
+        self._count = 0
+        self.rawSwitches = 0
+        self.outputSwitches = 0
+        self.delays = deque(maxlen=1000)
+
+    def set_rest_level(self, rms):
+        """
+        Fixes the rest level, e.g. to the baseline measured during MVC calibration.
+        """
+        self.restLevel = rms
+        self.fixedRestLevel = True
+
+    def update(self, label, confidence, rms=None):
+        """
+        Args:
+            label: Raw classifier decision for one window.
+            confidence (float): Probability of that decision.
+            rms (float): Summed RMS of the window over all channels, needed for the rest gate.
+
+        Returns:
+            tuple: Smoothed (label, confidence), label is None until a first decision is made.
+        """
+        self._count += 1
+        if label != self._rawLabel:
+            self._rawLabel = label
+            self._rawSince = self._count
+            self.rawSwitches += 1
+
+        if self.restLabel is not None and rms is not None:
+            if label == self.restLabel and not self.fixedRestLevel:
+                self._restRms.append(rms)
+                self.restLevel = np.mean(self._restRms)
+            if self.restLevel is not None and rms < self.restFactor * self.restLevel:
+                label, confidence = self.restLabel, 1.0
+
+        if confidence >= self.minConfidence:
+            self._held = (label, confidence)
+        if self._held is None:
+            return None, 0.0
+        self._votes.append(self._held)
+
+        counts = Counter(vote for vote, _ in self._votes)
+        winner, _ = counts.most_common(1)[0]
+        if self._output is not None and counts[self._output] == counts[winner]:
+            # Keep the current output on ties
+            winner = self._output
+        winnerConfidence = np.mean([c for vote, c in self._votes if vote == winner])
+
+        if winner != self._output:
+            if self._output is not None:
+                self.outputSwitches += 1
+                if winner == self._rawLabel:
+                    self.delays.append(self._count - self._rawSince)
+            self._output = winner
+        return winner, winnerConfidence
+
+    def added_latency(self):
+        """
+        Returns:
+            float: Extra delay in seconds the majority vote adds to a clean label change;
+            a new label needs voteWindow//2 + 1 windows to win.
+        """
+        return (self.voteWindow // 2) * self.hop
+
+    def latency_report(self):
+        """
+        Returns:
+            dict: Expected extra delay of the vote, measured delays between a raw label
+            change and the matching output change (50th/95th percentile), all in
+            milliseconds, and how many label switches were removed.
+        """
+        report = dict(expected_ms=self.added_latency() * 1000,
+                      raw_switches=self.rawSwitches, output_switches=self.outputSwitches)
+        if self.delays:
+            delays = np.array(self.delays) * self.hop * 1000
+            report.update(measured_p50_ms=np.percentile(delays, 50), measured_p95_ms=np.percentile(delays, 95))
+        return report
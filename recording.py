@@ -0,0 +1,332 @@
+import errno
+import os
+import queue
+import shutil
+import struct
+import threading
+import numpy as np
+
+# Binary recording layout (little-endian):
+#   64-byte header, see HEADER below
+#   sample block, nSamples x nChannels values of uint8 (8-bit) or uint16 (12-bit),
+#   stored sample by sample exactly as decoded from the device
+#   nMarkers trial markers, each a (start, end) pair of uint64 sample indices
+# nSamples is 0 while a recording is still being written; readers then derive it
+# from the file size, so an interrupted recording stays readable.
+MAGIC = b'EMGR'
+# Version 2 added nMarkers and the marker records after the samples.
+VERSION = 2
+HEADER = struct.Struct('<4sHHHHBBhhhhQI30x')
+HEADER_FIELDS = ('magic', 'version', 'headerSize', 'sampRate', 'channelMask', 'resolution',
+                 'nChannels', 'subject', 'motion', 'rep', 'shift', 'nSamples', 'nMarkers')
+# nMarkers uses bytes that were reserved in version 1, whose files read as unmarked.
+MARKER_DTYPE = np.dtype([('start', '<u8'), ('end', '<u8')])
+RECORDING_EXT = '.emg'
+# Suffix of recordings that are still being written.
+PART_EXT = '.part'
+
+
+def sample_dtype(resolution):
+    """
+    Returns the on-disk sample type for a resolution set in setEmgRawDataConfig.
+    """
+    return np.dtype(np.uint8) if resolution == 8 else np.dtype('<u2')
+
+
+class RecordingWriter():
+    """
+    Writes EMG samples incrementally into a binary recording file.
+
+    Attributes:
+        path (str): Path of the file being written.
+        header (dict): Header fields, see HEADER_FIELDS.
+        nSamples (int): Number of samples written so far.
+        bytesWritten (int): Size of the file so far, header included.
+        markers (list): (start, end) sample indices of the trials marked so far.
+
+    Methods:
+        write(block): Appends a [n_samples, n_channels] block of samples.
+        add_marker(start, end): Marks samples [start, end) as one trial.
+        close(): Writes the markers, stores the final counts in the header and closes the file.
+    """
+    def __init__(self, path, sampRate, channelMask, resolution, subject=-1, motion=-1, rep=-1, shift=-1):
+        """
+        Creates the file and writes its header.
+
+        Args:
+            path (str): Path of the recording file.
+            sampRate (int): Sample rate in Hz.
+            channelMask (int): Enabled channels, as passed to setEmgRawDataConfig.
+            resolution (int): 8 or 12 bits per sample.
+            subject, motion, rep, shift (int): Experiment metadata, -1 if unknown.
+        """
+        self.path = path
+        self.dtype = sample_dtype(resolution)
+        self.header = dict(magic=MAGIC, version=VERSION, headerSize=HEADER.size, sampRate=sampRate,
+                           channelMask=channelMask, resolution=resolution,
+                           nChannels=bin(channelMask & 0xFFFF).count('1'),
+                           subject=subject, motion=motion, rep=rep, shift=shift, nSamples=0, nMarkers=0)
+        self.nSamples = 0
+        self.markers = []
+        self.bytesWritten = HEADER.size
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(*(self.header[k] for k in HEADER_FIELDS)))
+
+    def write(self, block):
+        """
+        Appends samples to the file.
+
+        Args:
+            block (array [n_samples, n_channels]): Decoded samples, oldest first.
+        """
+        block = np.ascontiguousarray(block, dtype=self.dtype)
+        self.file.write(memoryview(block).cast('B'))
+        self.nSamples += len(block)
+        self.bytesWritten += block.nbytes
+
+    def add_marker(self, start, end):
+        """
+        Marks a trial, e.g. a contraction found by the onset detector. Markers are
+        kept in memory and written after the samples when the file is closed.
+
+        Args:
+            start, end (int): First and one past the last sample of the trial.
+        """
+        self.markers.append((start, end))
+
+    def close(self):
+        """
+        Writes the markers, stores the final counts in the header and closes the file.
+        """
+        if self.file.closed:
+            return
+        markers = np.array(self.markers, dtype=np.int64).reshape(-1, 2).clip(0, self.nSamples)
+        self.file.write(np.rec.fromarrays(markers.T, dtype=MARKER_DTYPE).tobytes())
+        self.header['nSamples'] = self.nSamples
+        self.header['nMarkers'] = len(markers)
+        self.file.seek(0)
+        self.file.write(HEADER.pack(*(self.header[k] for k in HEADER_FIELDS)))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class RecordingSink():
+    """
+    Hands sample blocks to a RecordingWriter running on a dedicated thread.
+
+    put() only enqueues, so the caller (the bluepy notification thread) never
+    waits on the disk. The writer thread wakes up every `flushInterval` seconds
+    and writes everything queued since as one concatenated block.
+
+    Attributes:
+        writer (RecordingWriter): The file the blocks go to.
+        dropped (int): Samples discarded because the queue was full or the sink was closed.
+
+    Methods:
+        put(block): Queues a [n_samples, n_channels] block without blocking.
+        add_marker(start, end): Marks samples [start, end) as one trial.
+        close(): Writes all queued blocks, stops the thread and closes the file.
+    """
+    def __init__(self, writer, maxsize=1024, flushInterval=0.2):
+        """
+        Starts the writer thread.
+
+        Args:
+            writer (RecordingWriter): The file the blocks go to.
+            maxsize (int): Maximum number of queued blocks.
+            flushInterval (float): Time between batched writes in seconds.
+        """
+        self.writer = writer
+        self.flushInterval = flushInterval
+        self.dropped = 0
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._closing = threading.Event()
+        self.thread = threading.Thread(name='recordingSink', target=self._run, daemon=True)
+        self.thread.start()
+
+    @property
+    def path(self):
+        return self.writer.path
+
+    @property
+    def queueDepth(self):
+        """Number of blocks waiting to be written."""
+        return self.queue.qsize()
+
+    @property
+    def bytesWritten(self):
+        """Bytes written to the file so far, header included."""
+        return self.writer.bytesWritten
+
+    def put(self, block):
+        """
+        Queues a block for writing. Never blocks; blocks are dropped and counted if
+        the queue is full or the sink is closing.
+
+        Args:
+            block (array [n_samples, n_channels]): Decoded samples, oldest first.
+        """
+        if self._closing.is_set():
+            self.dropped += len(block)
+            return
+        try:
+            self.queue.put_nowait(block)
+        except queue.Full:
+            self.dropped += len(block)
+
+    def add_marker(self, start, end):
+        """
+        Marks samples [start, end) of the recording as one trial, see RecordingWriter.add_marker().
+        """
+        self.writer.add_marker(start, end)
+
+    def _drain(self):
+        blocks = []
+        while True:
+            try:
+                blocks.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if blocks:
+            self.writer.write(np.concatenate(blocks))
+
+    def _run(self):
+        while not self._closing.wait(self.flushInterval):
+            self._drain()
+        self._drain()
+
+    def close(self):
+        """
+        Writes all queued blocks, waits for the writer thread and closes the file.
+        """
+        self._closing.set()
+        self.thread.join()
+        self.writer.close()
+        if self.dropped:
+            print(f"Recording {self.path}: dropped {self.dropped} samples, queue was full or sink was closed")
+
+    def finalize(self, path):
+        """
+        Closes the recording and moves it to its final path, see finalize_recording().
+
+        Args:
+            path (str): Final path of the recording.
+        """
+        self.close()
+        finalize_recording(self.writer.path, path)
+        self.writer.path = path
+
+
+def finalize_recording(src, dst):
+    """
+    Moves a closed recording to its final path.
+
+    On the same file system this is a single atomic rename, so no data is copied
+    and `dst` either does not exist or holds the whole recording. Across file
+    systems the file is copied next to `dst` first (shutil uses the kernel's
+    in-place copy where available) and then renamed into place.
+
+    Args:
+        src (str): Path of the closed recording.
+        dst (str): Final path, missing directories are created.
+    """
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        tmp = dst + PART_EXT
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+        os.remove(src)
+
+
+def read_header(path):
+    """
+    Reads the header of a binary recording.
+
+    Args:
+        path (str): Path of the recording file.
+
+    Returns:
+        dict: Header fields, see HEADER_FIELDS. nSamples is derived from the
+        file size for recordings that were not closed properly.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size or raw[:4] != MAGIC:
+        raise ValueError(f"{path} is not an EMG recording")
+    header = dict(zip(HEADER_FIELDS, HEADER.unpack(raw)))
+    if header['version'] > VERSION:
+        raise ValueError(f"{path} has unsupported recording version {header['version']}")
+    if header['version'] < 2:
+        header['nMarkers'] = 0
+    if header['nSamples'] == 0 and header['nMarkers'] == 0:
+        sampleSize = header['nChannels'] * sample_dtype(header['resolution']).itemsize
+        header['nSamples'] = (os.path.getsize(path) - header['headerSize']) // sampleSize
+    return header
+
+
+def open_recording(path):
+    """
+    Maps the samples of a binary recording into memory without reading them.
+
+    Args:
+        path (str): Path of the recording file.
+
+    Returns:
+        tuple (np.memmap [n_samples, n_channels], dict): Read-only samples and header.
+    """
+    header = read_header(path)
+    shape = (header['nSamples'], header['nChannels'])
+    if shape[0] == 0:
+        return np.zeros(shape, dtype=sample_dtype(header['resolution'])), header
+    data = np.memmap(path, dtype=sample_dtype(header['resolution']), mode='r',
+                     offset=header['headerSize'], shape=shape)
+    return data, header
+
+
+def read_markers(path):
+    """
+    Reads the trial markers of a binary recording.
+
+    Args:
+        path (str): Path of the recording file.
+
+    Returns:
+        array [n_markers] of MARKER_DTYPE: start and end sample of every marked trial,
+        empty for text recordings and recordings without markers.
+    """
+    if not path.endswith(RECORDING_EXT):
+        return np.zeros(0, dtype=MARKER_DTYPE)
+    header = read_header(path)
+    sampleSize = header['nChannels'] * sample_dtype(header['resolution']).itemsize
+    with open(path, 'rb') as f:
+        f.seek(header['headerSize'] + header['nSamples'] * sampleSize)
+        return np.frombuffer(f.read(header['nMarkers'] * MARKER_DTYPE.itemsize), dtype=MARKER_DTYPE)
+
+
+def load_recording(path, nChannels=8):
+    """
+    Loads the samples of a recording, binary or legacy space-separated text.
+
+    Args:
+        path (str): Path of a binary recording or of a text file with one packet per line.
+        nChannels (int): Number of channels of a text recording.
+
+    Returns:
+        array [n_samples, n_channels]: The raw samples, memory-mapped for binary recordings.
+    """
+    if not path.endswith('.txt'):
+        return open_recording(path)[0]
+    with open(path) as f:
+        values = np.array(f.read().split(), dtype=np.uint16)
+    if values.size and values.max() < 256:
+        values = values.astype(np.uint8)
+    return values[:values.size - values.size % nChannels].reshape(-1, nChannels)
@@ -0,0 +1,172 @@
+import threading
+import time
+import numpy as np
+
+from gforce import CommandType, DataNotifFlags, EmgRawDataDecoder, NotifDataType
+from recording import RECORDING_EXT, load_recording, read_header
+from simdevice import SimulatedPeripheral
+
+
+def recording_packets(path, samplesPerPacket=16):
+    """
+    Turns a recording back into the EMG notification packets the armband sent.
+
+    Args:
+        path (str): Binary (.emg) or legacy text recording, e.g. Subject_*/Shift_*/Motion_*_Rep_*.txt.
+        samplesPerPacket (int): Samples per packet, 16 for 128-byte packets at 8 bit.
+
+    Returns:
+        tuple: (list of bytes, EmgRawDataDecoder matching the recording).
+    """
+    data, sampRate, decoder = _load(path)
+    return [_packet(data[i:i + samplesPerPacket], decoder) for i in range(0, len(data), samplesPerPacket)], decoder
+
+
+def _load(path):
+    data = load_recording(path)
+    if path.endswith(RECORDING_EXT):
+        header = read_header(path)
+        return data, header['sampRate'], EmgRawDataDecoder(header['channelMask'], header['resolution'])
+    # Text recordings have no header, they were all taken at 500 Hz with 8 channels.
+    return data, 500, EmgRawDataDecoder(0xFF, 12 if data.dtype == np.uint16 else 8)
+
+
+def _packet(samples, decoder):
+    return bytes([NotifDataType['NTF_EMG_ADC_DATA']]) + np.ascontiguousarray(samples, dtype=decoder.dtype.newbyteorder('<')).tobytes()
+
+
+class ReplaySource():
+    """
+    Plays a recording back as EMG notification packets, at the recorded pace,
+    N times faster, or as fast as the consumer takes them.
+
+    Packets go to `onData`, the same entry point the Bluetooth notifications use
+    (searchwindow.ondata), so everything downstream runs as in a live session.
+
+    Attributes:
+        sampRate (int): Sample rate of the recording.
+        speed (float): Playback speed, 1 for real time, 0 for unthrottled.
+        nSamples (int): Length of the recording in samples.
+        position (int): Index of the next sample to play.
+        sent (int): Samples played since the last start or seek.
+        finished (threading.Event): Set when the end of the recording is reached or stop() was called.
+
+    Methods:
+        run(): Plays in the calling thread until the end or stop().
+        start(): Plays in a background thread.
+        seek(seconds): Continues playback from the given time.
+        stop(): Stops playback.
+        throughput(): Samples per second delivered since the last start or seek.
+    """
+    def __init__(self, path, onData, speed=1.0, start=0.0, samplesPerPacket=16, loop=False):
+        """
+        Args:
+            path (str): Binary (.emg) or legacy text recording.
+            onData (function): Called with every packet (bytes).
+            speed (float): Playback speed, 1 for real time, 0 for unthrottled.
+            start (float): Start time in seconds.
+            samplesPerPacket (int): Samples per packet, 16 for 128-byte packets at 8 bit.
+            loop (bool): Start over at the end instead of finishing.
+        """
+        self.data, self.sampRate, self.decoder = _load(path)
+        self.path = path
+        self.onData = onData
+        self.speed = speed
+        self.samplesPerPacket = samplesPerPacket
+        self.loop = loop
+        self.nSamples = len(self.data)
+        self.finished = threading.Event()
+        self.thread = None
+        self._lock = threading.Lock()
+        self.seek(start)
+
+    def seek(self, seconds):
+        """
+        Args:
+            seconds (float): Time in the recording to continue from; pacing restarts there.
+        """
+        with self._lock:
+            self.position = min(max(int(seconds * self.sampRate), 0), self.nSamples)
+            self._startPosition = self.position
+            self._startTime = time.perf_counter()
+            self.sent = 0
+
+    def run(self):
+        self.finished.clear()
+        while not self.finished.is_set():
+            with self._lock:
+                if self.position >= self.nSamples:
+                    if not self.loop:
+                        break
+                    self.position = self._startPosition = 0
+                    self._startTime = time.perf_counter()
+                start = self.position
+                samples = self.data[start:start + self.samplesPerPacket]
+                self.position += len(samples)
+                self.sent += len(samples)
+                due = self._startTime + (self.position - self._startPosition) / (self.sampRate * self.speed) if self.speed else 0
+            self.onData(_packet(samples, self.decoder))
+            delay = due - time.perf_counter()
+            if delay > 0:
+                self.finished.wait(delay)
+        self.finished.set()
+
+    def start(self):
+        self.seek(self.position / self.sampRate)
+        self.thread = threading.Thread(name='replaySource', target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.finished.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def throughput(self):
+        elapsed = time.perf_counter() - self._startTime
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+
+class ReplayPeripheral(SimulatedPeripheral):
+    """
+    Simulated armband that streams a recording instead of generated noise, so
+    GForceProfile, the GUI and the inference path run on recorded data. The
+    recording is played once data notifications are switched on, at its own
+    sample rate and format; a warning is printed if the host configures another.
+    """
+    def __init__(self, path, speed=1.0, start=0.0, loop=False, **kwargs):
+        """
+        Args:
+            path (str): Binary (.emg) or legacy text recording.
+            speed (float): Playback speed, 1 for real time, 0 for unthrottled.
+            start (float): Start time in seconds.
+            loop (bool): Start over at the end of the recording.
+            **kwargs: Passed to SimulatedPeripheral, e.g. mtu, loss or reorder.
+        """
+        super().__init__(**kwargs)
+        self.source = ReplaySource(path, self._onPacket, speed, start, loop=loop)
+
+    def _onPacket(self, packet):
+        for frame in self._frames(packet):
+            self._notify(self.DATA_HANDLE, frame)
+
+    def _onCommand(self, data):
+        super()._onCommand(data)
+        decoder = self.source.decoder
+        if data[0] == CommandType['CMD_SET_EMG_RAWDATA_CONFIG'] and \
+                (self.resolution, self.channelMask) != (decoder.resolution, decoder.channelMask):
+            print(f"Replaying {self.source.path} recorded with {decoder.nChannels} channels at "
+                  f"{decoder.resolution} bit, the host is configured for {bin(self.channelMask).count('1')} "
+                  f"channels at {self.resolution} bit")
+
+    def _stream(self):
+        while not self._stop.is_set():
+            if self.dataNotify and self.notifFlags & DataNotifFlags['DNF_EMG_RAW']:
+                print(f"Replaying {self.source.path} from {self.source.position / self.source.sampRate:.1f} s "
+                      f"at {'unthrottled' if not self.source.speed else f'{self.source.speed}x'} speed")
+                self.source.start()
+                while not self._stop.is_set() and not self.source.finished.is_set():
+                    self._stop.wait(0.1)
+                self.source.stop()
+                print(f"Replayed {self.source.sent} samples, {self.source.throughput():.0f} samples/s")
+                return
+            self._stop.wait(0.01)
@@ -0,0 +1,134 @@
+import threading
+import numpy as np
+
+
+class SampleRingBuffer():
+    """
+    Fixed-capacity multi-channel sample buffer backed by a preallocated NumPy array.
+
+    Samples are addressed by an absolute, monotonically increasing index: the n-th
+    sample ever written has index n, whatever slot it currently lives in. The first
+    `margin` slots are mirrored past the end of the storage, so any window of up to
+    `margin` samples is a contiguous slice and can be returned without copying.
+
+    Attributes:
+        capacity (int): Number of most recent samples kept.
+        n_channels (int): Number of channels per sample.
+        margin (int): Longest window that can be read back without a copy.
+        count (int): Total number of samples written so far (the write cursor).
+        cond (threading.Condition): Notified after every write, for readers waiting on new data.
+
+    Methods:
+        write(block): Appends a [n_samples, n_channels] block.
+        window(start, length): Returns a zero-copy view of samples [start, start+length).
+        latest(length): Returns a view of the most recent `length` samples.
+        wait_for(count, timeout): Blocks until at least `count` samples were written.
+    """
+    def __init__(self, capacity, n_channels=8, dtype=np.uint8, margin=1024):
+        """
+        Initializes a new, empty buffer.
+
+        Args:
+            capacity (int): Number of samples kept before the oldest ones are overwritten.
+            n_channels (int): Number of channels per sample.
+            dtype: Sample type, uint8 for 8-bit and uint16 for 12-bit resolution.
+            margin (int): Longest window readable without copying, at most `capacity`.
+        """
+        if margin > capacity:
+            raise ValueError("margin must not exceed capacity")
+        self.capacity = capacity
+        self.n_channels = n_channels
+        self.margin = margin
+        self.count = 0
+        self.cond = threading.Condition()
+        self._data = np.zeros([capacity + margin, n_channels], dtype=dtype)
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    @property
+    def oldest(self):
+        """Absolute index of the oldest sample still held in the buffer."""
+        return max(0, self.count - self.capacity)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def write(self, block):
+        """
+        Appends samples and wakes up any reader blocked in wait_for().
+
+        Args:
+            block (array [n_samples, n_channels]): The new samples, oldest first.
+        """
+        block = np.asarray(block).reshape(-1, self.n_channels)
+        total = len(block)
+        if total == 0:
+            return
+        # Only the newest `capacity` samples fit, but the older ones still count, so the
+        # absolute indices stay those of the stream.
+        block = block[-self.capacity:]
+        n = len(block)
+        pos = (self.count + total - n) % self.capacity
+        first = min(n, self.capacity - pos)
+        self._data[pos:pos + first] = block[:first]
+        if first < n:
+            self._data[:n - first] = block[first:]
+
+        # Keep the mirrored head in sync with slots [0, margin).
+        if pos < self.margin:
+            end = min(pos + first, self.margin)
+            self._data[self.capacity + pos:self.capacity + end] = self._data[pos:end]
+        if first < n:
+            end = min(n - first, self.margin)
+            self._data[self.capacity:self.capacity + end] = self._data[:end]
+
+        with self.cond:
+            self.count += total
+            self.cond.notify_all()
+
+    def window(self, start, length):
+        """
+        Returns samples [start, start+length) as a read-only view into the buffer.
+
+        The view is only valid until the writer wraps around onto it again, so
+        readers should consume it (or copy it) before falling `capacity` samples behind.
+
+        Args:
+            start (int): Absolute index of the first sample.
+            length (int): Number of samples, at most `margin`.
+
+        Returns:
+            array [length, n_channels]: The requested window.
+        """
+        if length > self.margin:
+            raise ValueError(f"window length {length} exceeds buffer margin {self.margin}")
+        if start < self.oldest or start + length > self.count:
+            raise IndexError(f"samples [{start}, {start + length}) not in buffer "
+                             f"[{self.oldest}, {self.count})")
+        pos = start % self.capacity
+        view = self._data[pos:pos + length]
+        view.flags.writeable = False
+        return view
+
+    def latest(self, length):
+        """
+        Returns a view of the most recent `length` samples (fewer if not written yet).
+        """
+        length = min(length, len(self))
+        return self.window(self.count - length, length)
+
+    def wait_for(self, count, timeout=None):
+        """
+        Blocks until at least `count` samples have been written in total.
+
+        Args:
+            count (int): Required value of the write cursor.
+            timeout (float): Maximum time to wait in seconds, None waits forever.
+
+        Returns:
+            bool: True if the samples are available, False on timeout.
+        """
+        with self.cond:
+            return self.cond.wait_for(lambda: self.count >= count, timeout)
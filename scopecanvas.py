@@ -0,0 +1,83 @@
+import time
+from collections import deque
+import numpy as np
+import pyqtgraph as pg
+from PyQt5 import QtCore
+from plotmodel import decimate_minmax
+
+
+class RawScopeCanvas(pg.GraphicsLayoutWidget):
+    """
+    Oscilloscope view of all raw EMG channels at the native sample rate.
+
+    Every frame reads the last `seconds` of samples straight from the shared
+    SampleRingBuffer and reduces them to a min/max pair per pixel column with
+    decimate_minmax(), so drawing costs the same at 500 Hz or 4 kHz and only
+    grows with the widget width. The timer only runs while the widget is visible.
+
+    Methods:
+        update_scale(new_val): Sets the vertical spacing of the channels in raw units.
+    """
+    def __init__(self, buffer, sampRate, seconds=4, interval=30, scale=None):
+        """
+        Args:
+            buffer (SampleRingBuffer): Buffer the acquisition thread writes decoded samples to.
+            sampRate (int): Sample rate in Hz.
+            seconds (float): Time span shown, limited by the buffer margin.
+            interval (int): Refresh period in milliseconds.
+            scale (float): Vertical spacing of the channels in raw units, by default
+                a quarter of the sample range.
+        """
+        super().__init__()
+        self.buffer = buffer
+        self.sampRate = sampRate
+        self.length = min(int(seconds * sampRate), buffer.margin)
+        self.scale = scale or (64 if buffer.dtype == np.uint8 else 1024)
+        self.frameTimes = deque(maxlen=500)
+
+        self.plot = self.addPlot()
+        self.plot.setMouseEnabled(False, False)
+        self.plot.hideButtons()
+        self.plot.setLabel('bottom', 'Time (s)')
+        self.plot.setXRange(-self.length / sampRate, 0, padding=0)
+        self.lines = [self.plot.plot(pen=pg.intColor(i, buffer.n_channels)) for i in range(buffer.n_channels)]
+        self.labels = [f'Channel {chan}' for chan in range(1, buffer.n_channels + 1)]
+        self._set_channel_axis()
+
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self._draw_frame)
+        self.interval = interval
+
+    def _set_channel_axis(self):
+        offsets = -self.scale * np.arange(1, self.buffer.n_channels + 1)
+        self.offsets = offsets
+        self.plot.setYRange(offsets[-1] - self.scale, 0, padding=0)
+        self.plot.getAxis('left').setTicks([list(zip(offsets, self.labels))])
+
+    def update_scale(self, new_val):
+        self.scale = new_val
+        self._set_channel_axis()
+
+    def showEvent(self, event):
+        self.timer.start(self.interval)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def _draw_frame(self):
+        t0 = time.perf_counter()
+        # Copy first, the acquisition thread keeps writing into the buffer.
+        end = self.buffer.count
+        length = min(self.length, len(self.buffer))
+        if not length:
+            return
+        data = np.array(self.buffer.window(end - length, length), dtype=np.float32)
+        x, y = decimate_minmax(data, max(int(self.plot.vb.width()), 100), end - len(data))
+        t = (x - end) / self.sampRate
+        # Remove each channel's DC level so the traces sit on their own baseline.
+        y = y - data.mean(0) + self.offsets
+        for i, line in enumerate(self.lines):
+            line.setData(t, y[:, i], skipFiniteCheck=True)
+        self.frameTimes.append(time.perf_counter() - t0)
@@ -2,25 +2,33 @@ from PyQt5 import  QtWidgets, QtCore, QtGui
 from gforce import  DataNotifFlags
 import os
 from  pagewindow import PageWindow
-from customcanvas import CustomFigCanvas
 import threading
 from datetime import datetime
-from helpers import set_cmd_cb, rms_formuula
+from helpers import set_cmd_cb
+from features import RunningWindowStats
 import random
 from communicate import Communicate
+from ringbuffer import SampleRingBuffer
+from windowing import WindowEngine
+from segmentation import StreamingOnsetDetector
 import time
-import numpy as np
 
 now = datetime.now()
 dt_string = now.strftime("%d/%m/%Y%H:%M:%S")
-os.makedirs(os.path.dirname(f"recordingfiles/{dt_string}.txt"), exist_ok=True)
-file1 = open(f"recordingfiles/{dt_string}.txt","w")
+recorder = None
+# Path the running recording is moved to if the save dialog is cancelled; it is written as this + PART_EXT.
+recordPath = None
 
 sampRate = 500
 channelMask = 0xFF
 dataLen = 128
 resolution = 8
-channels = []
+# Decoder of the configuration sent with setEmgRawDataConfig, set on connect.
+emgDecoder = None
+# Keep the last minute of raw samples, shape [capacity, channels], sized from emgDecoder
+# on connect; the raw scope reads up to SCOPE_SECONDS back without copying.
+SCOPE_SECONDS = 4
+channels = None
 actions = list(range(1,10))*5
 random.shuffle(actions)
 
@@ -34,10 +42,21 @@ BASELINE_MULTIPLIER = 100
 OFFSET_RMS = 0
 STARTED = False
 reg = None
+predictor = None
 packet_cnt = 0
 start_time = 0
-FORWARD = 0
 ind_channel = 0
+windowEngine = None
+# Post-processing of live predictions: majority vote length (windows) and minimum confidence.
+VOTE_WINDOW = 5
+MIN_CONFIDENCE = 0.5
+# Contractions found in the summed window RMS end MVC capture and mark trials in recordings.
+onsetDetector = StreamingOnsetDetector()
+# Absolute index of the first recorded sample, for the trial markers; set by ondata
+# from the first block that goes to the recorder, None until then.
+recordStart = None
+# Rows the plot may fall behind (10 s at 20 rows/s) before the oldest are dropped, 0 for no limit.
+MAX_PLOT_QUEUE = 200
 
 ACTIONS = {
     1: ["Flexion",          "img/Flexion.png",          (None, None),  0],
@@ -70,17 +89,21 @@ class SearchWindow(PageWindow):
         connect(*args): Connects to a device using the provided arguments.
         make_handleButton(button, *args): Generates a button handler function based on the provided button type and arguments.
         addData_callbackFunc(value): Callback function for adding data to the UI.
-        UiComponents(): Sets up the user interface components, including buttons and labels.
+        UiComponents(): Sets up the user interface components of the scan page.
+        VisualisationComponents(): Sets up the buttons, fields and labels of the visualisation page.
     """
-    def __init__(self, GF):
+    def __init__(self, GF, canvas='matplotlib'):
         """
         Initializes a new instance of the SearchWindow class.
 
         Args:
             GF (GForceProfile): An instance of the GForceProfile class for scanning
                 and connecting to devices.
+            canvas (str): Plotting backend, 'matplotlib' or 'pyqtgraph'.
         """
         super().__init__()
+        self.canvas = canvas
+        self.scope = None
         self.initUI()
         self.GF = GF
         self.devices = []
@@ -187,10 +210,16 @@ class SearchWindow(PageWindow):
             loadMotion: Loads a new motion/action for recording.
             stopRecord: Stop adn save the raw EMG data into file.
             updateMotion: LOad new action.
+            skipSignal: skip the plot forward to the newest complete window.
+            latestOnly: switch the window engine between every window and latest window only.
+            rawScope: switch the plot between the window features and the raw 500 Hz signal.
+            trainModel: load the trained model and start live classification.
+            backToCollect: stop live classification.
         """
         def handleButton():
             global reg,  ACTION, REP, PEAK, PEAK_MULTIPLIER, OFFSET, STARTED, BASELINE, BASELINE_MULTIPLIER
-            global OFFSET_RMS, file1
+            global OFFSET_RMS, recorder, recordPath, windowEngine, dt_string, predictor, recordStart
+            global emgDecoder, channels
             
             if button == "scan":
                 """
@@ -213,9 +242,13 @@ class SearchWindow(PageWindow):
                 Create and execute myDataLoop thread
                 """
                 self.connect(*args)
+                self.VisualisationComponents()
                 QtWidgets.qApp.processEvents()
 
                 self.GF.setEmgRawDataConfig(sampRate, channelMask, dataLen, resolution, cb=set_cmd_cb, timeout=1000)
+                # Decode with the channel mask and resolution the armband was configured for.
+                emgDecoder = self.GF.emgDecoder
+                channels = SampleRingBuffer(60*sampRate, emgDecoder.nChannels, emgDecoder.dtype, margin=SCOPE_SECONDS*sampRate)
                 self.GF.setDataNotifSwitch(DataNotifFlags['DNF_EMG_RAW'], set_cmd_cb, 1000)
                 self.GF.startDataNotification(ondata)
 
@@ -232,13 +265,16 @@ class SearchWindow(PageWindow):
                 
                 QtWidgets.qApp.processEvents()
 
-                while True:
-                    if len(channels)>128: 
-                        break
-                self.myFig = CustomFigCanvas()
+                # Wait for the first full packet before plotting.
+                channels.wait_for(dataLen//8 + 1)
+                self.myFig = make_canvas(self.canvas)
                 self.layout.addWidget(self.myFig)
+                # Start with the newest data, everything received before the plot existed is skipped.
+                windowEngine = WindowEngine(channels, 50, 25, latest_only=self.latestOnlyBox.isChecked())
+                windowEngine.skip_to_latest()
                 #Add the callbackfunc to ..
-                myDataLoop = threading.Thread(name = 'myDataLoop', target = dataSendLoop, daemon = True, args = (self.addData_callbackFunc,))
+                myDataLoop = threading.Thread(name = 'myDataLoop', target = dataSendLoop, daemon = True,
+                                              args = (self.addData_callbackFunc, windowEngine, self.segment_signal.data_signal.emit))
                 myDataLoop.start()
 
             elif button == "caliberate":
@@ -284,13 +320,21 @@ class SearchWindow(PageWindow):
             elif button == "startRecord":
                 """
                 Update the amplitude of figure by e3*e2
-                open the file in folder recordingfiles 
+                open the binary recording file in folder recordingfiles 
                 """
+                from recording import RecordingWriter, RecordingSink, RECORDING_EXT, PART_EXT
                 self.myFig.update_amp(float(self.e3.text())* float(self.e2.text()))
                 self.recordSamplButton.setText("Recording ...")
                 self.recordSamplButton.setEnabled(False)
                 self.loadMotionButton.setEnabled(False)
-                file1 = open(f"recordingfiles/{dt_string}.txt","w")
+                self.stopSamplButton.setEnabled(True)
+                dt_string = datetime.now().strftime("%d/%m/%Y%H:%M:%S")
+                recordPath = f"recordingfiles/{dt_string}{RECORDING_EXT}"
+                os.makedirs(os.path.dirname(recordPath), exist_ok=True)
+                recorder = RecordingSink(RecordingWriter(recordPath + PART_EXT, sampRate, channelMask, resolution,
+                                           subject=int(self.subj_name.text()), motion=int(float(self.subj_motion.text())),
+                                           rep=int(self.subj_rep.text()), shift=int(self.subj_shift.text())))
+                recordStart = None
                 STARTED= True
 
             elif button == "loadMotion":
@@ -304,26 +348,37 @@ class SearchWindow(PageWindow):
             
             elif button == "stopRecord":
                 """
-                Open the folder, open the file text based on subject, shift, motion, rep
+                Open the folder, move the recording to the file based on subject, shift, motion, rep
+                (kept in recordingfiles if the dialog is cancelled)
                 Update the current action last element value +1 
                 Set adn enable the Record Experiment. 
                 """
+                from recording import RECORDING_EXT
+                if recorder is None:
+                    return
                 STARTED = False
-                file1.close()
+                self.stopSamplButton.setEnabled(False)
+                # Blocks until everything queued is on disk, so the file is complete before it is moved.
+                recorder.close()
+                print(f"Recorded {recorder.writer.nSamples} samples, {recorder.bytesWritten} bytes")
                 os.makedirs(os.path.dirname(f"Subject_{self.subj_name.text()}/Shift_{self.subj_shift.text()}/"), exist_ok=True)
                 name = QtWidgets.QFileDialog.getSaveFileName(self, 'Save File',
-                                                             f"Subject_{self.subj_name.text()}/Shift_{self.subj_shift.text()}/Motion_{self.subj_motion.text()}_Rep_{self.subj_rep.text()}.txt",  
-                                                             "Text Files(*.txt)")
+                                                             f"Subject_{self.subj_name.text()}/Shift_{self.subj_shift.text()}/Motion_{self.subj_motion.text()}_Rep_{self.subj_rep.text()}{RECORDING_EXT}",  
+                                                             f"EMG Recordings(*{RECORDING_EXT})")
                 
                 try:
                     print(name)
-                    os.makedirs(os.path.dirname(name[0]), exist_ok=True)
-                    os.system(f'cp {file1.name} {name[0]}')  
-                    current_action = int(self.subj_motion.text())
-                    ACTIONS[current_action][-1] += 1
+                    if name[0]:
+                        recorder.finalize(name[0])
+                        current_action = int(self.subj_motion.text())
+                        ACTIONS[current_action][-1] += 1
+                    else:
+                        recorder.finalize(recordPath)
                     self.loadMotionButton.setEnabled(True)
                 except Exception as e:
                     print("Error during saving: ", e)
+                # The file is finished, a later Stop must not move it again.
+                recorder = None
 
                 self.recordSamplButton.setText("Record Experiment")
                 self.recordSamplButton.setEnabled(True)
@@ -339,22 +394,89 @@ class SearchWindow(PageWindow):
                     print("Error during update motion: ", e)
 
             elif button=='trainModel':
+                """
+                Load the trained model once and start classifying every window on the inference thread.
+                The inference code is imported on first use, it is not needed to collect data.
+                """
+                from inference import InferenceWorker, load_model
+                from postprocessing import DecisionSmoother
+                try:
+                    reg = load_model()
+                except Exception as e:
+                    print("Error during loading model: ", e)
+                    return
+                smoother = DecisionSmoother(VOTE_WINDOW, MIN_CONFIDENCE, restLabel=len(ACTIONS)-1,
+                                            hop=windowEngine.hop/sampRate if windowEngine else 0.05)
+                print("Decision smoothing adds", smoother.added_latency()*1000, "ms")
+                predictor = InferenceWorker(reg, self.prediction_signal.data_signal.emit, smoother=smoother)
                 self.trainModelButton.setText('Back to Collection Mode')
+                self.trainModelButton.clicked.disconnect()
                 self.trainModelButton.clicked.connect(self.make_handleButton("backToCollect"))
                 QtWidgets.qApp.processEvents()
-                reg = load_NonLinearmodel()
 
             elif button=='backToCollect':
-                
+                running, predictor = predictor, None
+                if running:
+                    running.stop()
+                    print("Inference latency (ms): ", running.latency_stats())
+                    print("Decision smoothing: ", running.smoother.latency_report())
+                print("Plot queue: ", self.myFig.addedData.stats())
+                self.trainModelButton.clicked.disconnect()
                 self.trainModelButton.clicked.connect(self.make_handleButton("trainModel"))
                 self.trainModelButton.setText('Train Model')
+                self.predictionLabel.setText("")
                 QtWidgets.qApp.processEvents()
                 reg = None
             elif button == "skipSignal":
-                FORWARD += 1000
+                if windowEngine:
+                    windowEngine.skip_to_latest()
+
+            elif button == "latestOnly":
+                if windowEngine:
+                    windowEngine.latest_only = self.latestOnlyBox.isChecked()
+
+            elif button == "rawScope":
+                """
+                Show the raw scope instead of the feature plot, or back. The scope is created on first use
+                and only refreshes while visible.
+                """
+                if self.scope is None:
+                    from scopecanvas import RawScopeCanvas
+                    self.scope = RawScopeCanvas(channels, sampRate, SCOPE_SECONDS)
+                    self.scope.hide()
+                    self.layout.addWidget(self.scope)
+                showScope = self.scope.isHidden()
+                self.myFig.setVisible(not showScope)
+                self.scope.setVisible(showScope)
+                self.rawScopeButton.setText("Feature plot" if showScope else "Raw scope")
 
         return handleButton
     
+    def prediction_callbackFunc(self, value):
+        """
+        Show a prediction [label, confidence, latency] of the inference thread.
+        """
+        label, confidence, latency = value
+        self.predictionLabel.setText(f"{ACTIONS[int(label)+1][0]} ({confidence:.0%}, {latency*1000:.1f} ms)")
+
+    def segment_callbackFunc(self, value):
+        """
+        Handle a contraction [event, start, end, baseline, peak] found by the onset detector.
+
+        At an offset, a running MVC capture is stored as if pauseMVC was clicked, with the
+        detector's rest baseline and contraction peak, and a running recording gets a
+        trial marker from onset to offset.
+        """
+        global BASELINE, PEAK
+        event, start, end, baseline, peak = value
+        if event != 'offset':
+            return
+        if self.pauseMVCButton.isEnabled():
+            BASELINE, PEAK = baseline, peak
+            self.make_handleButton("pauseMVC")()
+        if STARTED and recorder and recordStart is not None and start >= recordStart:
+            recorder.add_marker(start - recordStart, end - recordStart)
+
     def addData_callbackFunc(self, value):
         """
         add new value to the myFig through method addData.
@@ -392,8 +514,9 @@ class SearchWindow(PageWindow):
         
         Subject Form Layout (self.subj_flo):
             Contents: Input fields for subject name, motion, repetition, and shift (self.subj_name, self.subj_motion, self.subj_rep, self.subj_shift)
+
+        Only the scan page (layout0, layout1, layout2) is created here, the rest by VisualisationComponents().
         """
-        global actions
         self.layout = QtWidgets.QVBoxLayout()
         self.layout0 = QtWidgets.QHBoxLayout()
 
@@ -424,6 +547,13 @@ class SearchWindow(PageWindow):
 
         self.layout2 = QtWidgets.QVBoxLayout()
 
+    def VisualisationComponents(self):
+        """
+        Set up the components of the visualisation page: calibration, MVC, subject and
+        recording fields and buttons (layout3, layout4, layout5, flo, subj_flo).
+        They are created when a device is connected, so the scan page appears without them.
+        """
+        global actions
 
         self.layout3 = QtWidgets.QHBoxLayout()
         self.e1 = QtWidgets.QLineEdit("20")
@@ -477,9 +607,10 @@ class SearchWindow(PageWindow):
         self.recordSamplButton.clicked.connect(self.make_handleButton("startRecord"))
         self.recordSamplButton.setFixedSize(150,30)
         
-        stopSamplButton = QtWidgets.QPushButton("Stop")
-        stopSamplButton.clicked.connect(self.make_handleButton("stopRecord"))
-        stopSamplButton.setFixedSize(150,30)
+        self.stopSamplButton = QtWidgets.QPushButton("Stop")
+        self.stopSamplButton.setEnabled(False)
+        self.stopSamplButton.clicked.connect(self.make_handleButton("stopRecord"))
+        self.stopSamplButton.setFixedSize(150,30)
 
         self.trainModelButton = QtWidgets.QPushButton("Train model")
         self.trainModelButton.clicked.connect(self.make_handleButton("trainModel"))
@@ -489,10 +620,20 @@ class SearchWindow(PageWindow):
         self.skipSignalButton.clicked.connect(self.make_handleButton("skipSignal"))
         self.skipSignalButton.setFixedSize(150,30)
 
+        self.latestOnlyBox = QtWidgets.QCheckBox("Latest window only")
+        self.latestOnlyBox.stateChanged.connect(self.make_handleButton("latestOnly"))
+
+        self.rawScopeButton = QtWidgets.QPushButton("Raw scope")
+        self.rawScopeButton.clicked.connect(self.make_handleButton("rawScope"))
+        self.rawScopeButton.setFixedSize(150,30)
+
         self.layout3.addWidget(self.loadMotionButton)
         self.layout3.addWidget(self.recordSamplButton)
-        self.layout3.addWidget(stopSamplButton)
+        self.layout3.addWidget(self.stopSamplButton)
         self.layout3.addWidget(self.skipSignalButton)
+        self.layout3.addWidget(self.latestOnlyBox)
+        self.layout3.addWidget(self.rawScopeButton)
+        self.layout3.addWidget(self.trainModelButton)
 
         self.subj_name = QtWidgets.QLineEdit("1")
         self.subj_name.setValidator(QtGui.QIntValidator())
@@ -534,18 +675,42 @@ class SearchWindow(PageWindow):
 
         self.actionImg = QtWidgets.QLabel()
         self.actionImg.setAlignment(QtCore.Qt.AlignCenter)
+        self.predictionLabel = QtWidgets.QLabel()
+        self.predictionLabel.setFixedSize(300,30)
+        self.predictionLabel.setAlignment(QtCore.Qt.AlignCenter)
+
+        # Predictions are emitted on the inference thread, the signal delivers them on the UI thread.
+        self.prediction_signal = Communicate()
+        self.prediction_signal.data_signal.connect(self.prediction_callbackFunc)
+        self.segment_signal = Communicate()
+        self.segment_signal.data_signal.connect(self.segment_callbackFunc)
+
         self.layout5.addWidget(self.actionLabel)
         self.layout5.addWidget(self.actionImg)
+        self.layout5.addWidget(self.predictionLabel)
+
+def make_canvas(kind):
+    """
+    Creates the plotting canvas selected at startup, importing only that backend.
+
+    Args:
+        kind (str): 'matplotlib' for CustomFigCanvas or 'pyqtgraph' for PgFigCanvas.
+    """
+    if kind == 'pyqtgraph':
+        from pgcanvas import PgFigCanvas
+        return PgFigCanvas(maxQueue=MAX_PLOT_QUEUE)
+    from customcanvas import CustomFigCanvas
+    return CustomFigCanvas(maxQueue=MAX_PLOT_QUEUE)
 
 def ondata(data):
     """
-    Function to write data into a gloabl file: file1 
+    Function to decode a packet into the sample buffer and, while recording, the global recorder.
 
     Args:
     data (array 2 dimens/ Pandan dataframe): The raw data.
     
     """
-    global STARTED, channels, file1
+    global STARTED, channels, recorder, recordStart
 
         # Data for EMG CH0~CHn repeatly.
         # Resolution set in setEmgRawDataConfig:
@@ -556,53 +721,65 @@ def ondata(data):
         # eg. 12bpp mode, {data[2], data[1]} = channel[0], {data[4], data[3]} = channel[1] and so on
 
         # # end for
-        
-    extracted_data = data[1:]
-    channels += extracted_data
+
+    block = emgDecoder.decode(data)
+    start = channels.count
+    channels.write(block)
 
     if STARTED:
-        file1.write(' '.join(map(str, extracted_data)) +"\n")
+        # Taken here rather than on "Record Experiment", so a packet arriving in between
+        # cannot shift the markers.
+        if recordStart is None:
+            recordStart = start
+        recorder.put(block)
 
-def dataSendLoop(addData_callbackFunc):
+def dataSendLoop(addData_callbackFunc, engine, segment_callbackFunc=None):
     # Setup the signal-slot mechanism.
     """
-    Continuous loop for sending data to the callback function for plotting.
+    Loop sending features of every new window to the callback function for plotting.
 
     Args:
         addData_callbackFunc (function): Callback function to which the data is sent.
+        engine (WindowEngine): Source of the 50-sample windows, blocks until new samples arrive.
+        segment_callbackFunc (function): Called with [event, start, end, baseline, peak] when
+            onsetDetector reports a contraction onset or offset, positions in samples.
 
-    This function sets up the signal-slot mechanism and continuously sends data to the specified callback function for plotting.
-    It iterates over the data channels, calculates features, and emits the data to the callback function.
+    This function sets up the signal-slot mechanism and sends data to the specified callback function for plotting.
+    For each window produced by the engine it calculates features and emits the data to the callback function.
 
     Note:
         This function assumes the availability of global variables: PEAK, PEAK_MULTIPLIER, BASELINE, OFFSET_RMS, BASELINE_MULTIPLIER,
-        ACTIONS, FORWARD, and reg.
+        ACTIONS, reg and predictor.
 
     """
     mySrc = Communicate()
     mySrc.data_signal.connect(addData_callbackFunc)
-    #time.sleep(3)
-    global PEAK, PEAK_MULTIPLIER, BASELINE, OFFSET_RMS, BASELINE_MULTIPLIER,ACTIONS,FORWARD, reg
-    while(True):
-        #channels[i:i+50*8]
-        for j in range (8):
-            try:
-                datawindow = channels[FORWARD:FORWARD+50*8]
-                if datawindow:
-                    datastack = np.stack([np.array(datawindow[k::8]) for k in range (8)]).astype('float32') - OFFSET
-                    mean_in_window = datastack.mean(1) # should have size (8,)
-                    rms_ = rms_formuula(datastack/255)
-                    rms = rms_.sum()- OFFSET_RMS
-                    
-                    if OFFSET_RMS:
-                        mySrc.data_signal.emit([rms] + list(mean_in_window))
-                    else:
-                        BASELINE = min(rms*BASELINE_MULTIPLIER, BASELINE)
-                        PEAK = max(rms*PEAK_MULTIPLIER, PEAK)
-                        mySrc.data_signal.emit([rms] + list(mean_in_window))
-                    FORWARD += 25*8 
-                time.sleep(47/1000)
-
+    global PEAK, PEAK_MULTIPLIER, BASELINE, OFFSET_RMS, BASELINE_MULTIPLIER,ACTIONS, reg, predictor
+    # Running sums over the window, only the samples new since the previous window are added.
+    stats = RunningWindowStats(engine.buffer.n_channels, engine.length, OFFSET, 1)
+    for start, window in engine:
+        try:
+            arrival = time.perf_counter()
+            stats.update(start, window)
+            mean_in_window = stats.mean() # should have size (8,)
+            rms_ = stats.rms()/255
+            rms = rms_.sum()- OFFSET_RMS
+
+            running = predictor
+            if running:
+                running.submit(rms_, arrival, rms_.sum())
+
+            event = onsetDetector.update(rms_.sum(), start)
+            if event and segment_callbackFunc:
+                end = onsetDetector.end if event == 'offset' else onsetDetector.start
+                segment_callbackFunc([event, onsetDetector.start, end, onsetDetector.baseline, onsetDetector.peak])
+
+            if OFFSET_RMS:
+                mySrc.data_signal.emit([rms] + list(mean_in_window))
+            else:
+                BASELINE = min(rms*BASELINE_MULTIPLIER, BASELINE)
+                PEAK = max(rms*PEAK_MULTIPLIER, PEAK)
+                mySrc.data_signal.emit([rms] + list(mean_in_window))
 
-            except Exception as e:
-                print("Error during plotting:", type(e),e) 
+        except Exception as e:
+            print("Error during plotting:", type(e),e)
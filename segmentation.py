@@ -0,0 +1,197 @@
+from collections import deque
+import numpy as np
+
+
+def _stack(activities):
+    # Trials of different lengths are right-aligned in one NaN-padded matrix, so the
+    # baseline windows at the end of every trial share the same columns.
+    lengths = np.array([len(a) for a in activities])
+    width = lengths.max() if len(lengths) else 0
+    stacked = np.full((len(activities), width), np.nan)
+    for row, activity in zip(stacked, activities):
+        row[width - len(activity):] = activity
+    return stacked, width - lengths
+
+
+def _baseline(stacked, baselineWindows):
+    with np.errstate(invalid='ignore'):
+        return np.nanmean(stacked[:, -baselineWindows:], axis=1)
+
+
+def _first_last(above):
+    # Index of the first and one past the last True per row; (0, 0) for rows without any.
+    found = above.any(1)
+    first = np.argmax(above, axis=1)
+    last = above.shape[1] - np.argmax(above[:, ::-1], axis=1)
+    return np.where(found, first, 0), np.where(found, last, 0), found
+
+
+def threshold_segments(activities, factor=2.0, baselineWindows=50):
+    """
+    Finds the contraction of every trial with the rule of the training notebook:
+    from the first to the last window whose activity exceeds `factor` times the
+    mean of the last `baselineWindows` windows, where the subject is at rest.
+
+    All trials are processed together in one padded matrix. Unlike the notebook,
+    a contraction that lasts until the final window keeps its end (the notebook's
+    `-np.argmax(...)` slice end became -0 and selected nothing).
+
+    Args:
+        activities (list of arrays [n_windows]): Activity of each trial, e.g. the RMS
+            summed over channels, as returned by dataset.file_features().
+        factor (float): Threshold as a multiple of the rest baseline.
+        baselineWindows (int): Number of final windows the baseline is taken from.
+
+    Returns:
+        tuple of int arrays [n_trials]: start and end (exclusive) window of each
+        contraction, both 0 if a trial never crosses the threshold.
+    """
+    if not len(activities):
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    stacked, pad = _stack(activities)
+    threshold = factor * _baseline(stacked, baselineWindows)
+    with np.errstate(invalid='ignore'):
+        above = stacked > threshold[:, None]
+    first, last, found = _first_last(above)
+    return np.where(found, first - pad, 0), np.where(found, last - pad, 0)
+
+
+def hysteresis_segments(activities, onFactor=2.0, offFactor=1.5, baselineWindows=50):
+    """
+    Double-threshold variant of threshold_segments(): a contraction is detected
+    where the activity exceeds `onFactor` times the baseline, and then extended in
+    both directions for as long as it stays above `offFactor` times the baseline.
+    This keeps the slow rise and fall of a contraction that a single high
+    threshold cuts off, without letting rest noise start a segment.
+
+    Args:
+        activities (list of arrays [n_windows]): Activity of each trial.
+        onFactor (float): Threshold that detects a contraction, times the baseline.
+        offFactor (float): Threshold the contraction must stay above, at most onFactor.
+        baselineWindows (int): Number of final windows the baseline is taken from.
+
+    Returns:
+        tuple of int arrays [n_trials]: start and end (exclusive) window of each
+        contraction, both 0 if a trial never crosses the on threshold.
+    """
+    if not len(activities):
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    stacked, pad = _stack(activities)
+    baseline = _baseline(stacked, baselineWindows)
+    with np.errstate(invalid='ignore'):
+        above = stacked > onFactor * baseline[:, None]
+        # Padding counts as below, so a segment never extends into it.
+        below = ~(stacked > offFactor * baseline[:, None])
+    first, last, found = _first_last(above)
+    columns = np.arange(stacked.shape[1])
+    start = np.where(below & (columns < first[:, None]), columns, -1).max(1) + 1
+    end = np.where(below & (columns >= last[:, None]), columns, stacked.shape[1]).min(1)
+    return np.where(found, start - pad, 0), np.where(found, end - pad, 0)
+
+
+class StreamingOnsetDetector():
+    """
+    Live counterpart of hysteresis_segments(): finds contraction onsets and
+    offsets in a stream of window activities (e.g. the summed RMS of every window).
+
+    The rest baseline is the mean activity of the last `baselineWindows` windows
+    outside contractions, kept with a running sum. An onset is reported once
+    `minOnWindows` consecutive windows exceed onFactor times the baseline, an
+    offset once `minOffWindows` consecutive windows are at or below offFactor
+    times the baseline, so each event comes at most that many windows late and
+    short spikes or dips are ignored.
+
+    Attributes:
+        active (bool): Whether a contraction is in progress.
+        baseline (float): Current rest level, None until `minBaselineWindows` rest windows were seen.
+        peak (float): Highest activity of the current or last contraction.
+        start (int): Index of the first window of the current or last contraction.
+        end (int): Index one past the last window of the last contraction.
+
+    Methods:
+        update(value, index): Adds one window; returns 'onset', 'offset' or None.
+        latency(hop): Longest detection delay in seconds.
+    """
+    def __init__(self, onFactor=2.0, offFactor=1.5, baselineWindows=50, minOnWindows=2, minOffWindows=4,
+                 minBaselineWindows=10):
+        """
+        Args:
+            onFactor (float): Threshold that starts a contraction, times the baseline.
+            offFactor (float): Threshold a contraction must stay above, times the baseline.
+            baselineWindows (int): Number of rest windows the baseline is averaged over.
+            minOnWindows (int): Consecutive windows above the on threshold needed for an onset.
+            minOffWindows (int): Consecutive windows below the off threshold needed for an offset.
+            minBaselineWindows (int): Rest windows needed before anything is detected.
+        """
+        self.onFactor = onFactor
+        self.offFactor = offFactor
+        self.minOnWindows = minOnWindows
+        self.minOffWindows = minOffWindows
+        self.minBaselineWindows = minBaselineWindows
+        self.active = False
+        self.baseline = None
+        self.peak = 0.0
+        self.start = None
+        self.end = None
+        self._rest = deque(maxlen=baselineWindows)
+        self._restSum = 0.0
+        self._pending = []
+
+    def _add_rest(self, value):
+        if len(self._rest) == self._rest.maxlen:
+            self._restSum -= self._rest[0]
+        self._rest.append(value)
+        self._restSum += value
+        if len(self._rest) >= self.minBaselineWindows:
+            self.baseline = self._restSum / len(self._rest)
+
+    def update(self, value, index):
+        """
+        Args:
+            value (float): Activity of the window.
+            index (int): Position of the window, e.g. its first sample; events refer to it.
+
+        Returns:
+            str: 'onset' when a contraction is confirmed (it started at `start`),
+            'offset' when it is over (it ended at `end`), None otherwise.
+        """
+        if not self.active:
+            if self.baseline is not None and value > self.onFactor * self.baseline:
+                self._pending.append((value, index))
+                if len(self._pending) >= self.minOnWindows:
+                    self.active = True
+                    self.start = self._pending[0][1]
+                    self.peak = max(v for v, _ in self._pending)
+                    self._pending = []
+                    return 'onset'
+                return None
+            # A spike too short for an onset still counts as rest.
+            for v, _ in self._pending:
+                self._add_rest(v)
+            self._pending = []
+            self._add_rest(value)
+            return None
+
+        if value > self.offFactor * self.baseline:
+            self.peak = max(self.peak, value)
+            self._pending = []
+            return None
+        self._pending.append((value, index))
+        if len(self._pending) >= self.minOffWindows:
+            self.active = False
+            self.end = self._pending[0][1]
+            for v, _ in self._pending:
+                self._add_rest(v)
+            self._pending = []
+            return 'offset'
+        return None
+
+    def latency(self, hop):
+        """
+        Args:
+            hop (float): Time between windows in seconds.
+
+        Returns:
+            float: Longest delay between a contraction's onset or offset and its report.
+        """
+        return max(self.minOnWindows, self.minOffWindows) * hop
@@ -0,0 +1,245 @@
+"""
+Simulated gForce armband with the parts of the bluepy API that GForceProfile uses.
+
+    GF = GForceProfile(SimulatedPeripheral(loss=0.01), SimulatedScanner())
+
+The peripheral answers commands on the command characteristic and, once EMG raw
+data notifications are switched on, streams NTF_EMG_ADC_DATA packets in the
+configured sample rate, channel mask and resolution. Packets longer than the MTU
+are split into NTF_PARTIAL_DATA frames, as the armband does.
+"""
+import queue
+import struct
+import threading
+import time
+import numpy as np
+
+from gforce import (CMD_NOTIFY_CHAR_UUID, DATA_NOTIFY_CHAR_UUID, SERVICE_GUID, CommandType,
+                    DataNotifFlags, NotifDataType, ResponseResult)
+
+SIM_ADDRESS = 'SI:MU:LA:TE:D0:01'
+
+
+class SimulatedCharacteristic():
+    """
+    Stand-in for bluepy.btle.Characteristic: writes go to the simulated peripheral.
+    """
+    def __init__(self, peripheral, uuid, handle):
+        self.peripheral = peripheral
+        self.uuid = uuid
+        self.handle = handle
+
+    def getHandle(self):
+        return self.handle
+
+    def write(self, data, withResponse=False):
+        self.peripheral.writeCharacteristic(self.handle, bytes(data), withResponse)
+
+
+class SimulatedPeripheral():
+    """
+    Stand-in for bluepy.btle.Peripheral that behaves like a gForce armband.
+
+    Notifications are queued by the streaming thread and command handling and are
+    handed to the delegate from waitForNotifications(), in the caller's thread,
+    like bluepy does.
+
+    Attributes:
+        sampRate (int): Samples per second per channel, set by CMD_SET_EMG_RAWDATA_CONFIG.
+        channelMask (int): Enabled channels.
+        dataLen (int): Bytes of samples per EMG packet.
+        resolution (int): 8 or 12 bit.
+        sent (int): Notifications queued for the host.
+        lost (int): Notifications dropped on purpose.
+        reordered (int): Notifications swapped with the next one on purpose.
+
+    Methods:
+        connect(addr, addrType): Connects; the address is not checked.
+        setMTU(mtu): Negotiates the MTU, returns {'mtu': [mtu]}.
+        waitForNotifications(timeout): Delivers one pending notification to the delegate.
+        disconnect(): Stops streaming.
+    """
+    CMD_HANDLE = 0x0E
+    DATA_HANDLE = 0x11
+
+    def __init__(self, sampRate=500, channelMask=0xFF, dataLen=128, resolution=8, mtu=200,
+                 loss=0.0, reorder=0.0, seed=None):
+        """
+        Args:
+            sampRate (int): Initial sample rate, e.g. 500 to 4000 Hz for stress tests.
+            channelMask (int): Initial channel mask.
+            dataLen (int): Initial bytes of samples per packet.
+            resolution (int): Initial resolution, 8 or 12 bit.
+            mtu (int): Largest MTU the peripheral accepts.
+            loss (float): Probability of dropping each notification.
+            reorder (float): Probability of sending a notification after the next one.
+            seed (int): Seed of the random generator, for repeatable runs.
+        """
+        self.sampRate = sampRate
+        self.channelMask = channelMask
+        self.dataLen = dataLen
+        self.resolution = resolution
+        self.maxMtu = mtu
+        self.mtu = 23
+        self.loss = loss
+        self.reorder = reorder
+        self.sent = 0
+        self.lost = 0
+        self.reordered = 0
+        self.delegate = None
+        self.connected = False
+        self.notifFlags = 0
+        self.dataNotify = False
+        self.cmdNotify = False
+        self._rng = np.random.default_rng(seed)
+        self._held = None
+        self._notifications = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+        self._characteristics = [SimulatedCharacteristic(self, CMD_NOTIFY_CHAR_UUID, self.CMD_HANDLE),
+                                 SimulatedCharacteristic(self, DATA_NOTIFY_CHAR_UUID, self.DATA_HANDLE)]
+
+    def connect(self, addr, addrType='public'):
+        self.connected = True
+        self._stop.clear()
+        self._thread = threading.Thread(name='simulatedEmg', target=self._stream, daemon=True)
+        self._thread.start()
+
+    def disconnect(self):
+        self.connected = False
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def setMTU(self, mtu):
+        self.mtu = min(mtu, self.maxMtu)
+        return {'mtu': [self.mtu]}
+
+    def getCharacteristics(self):
+        return self._characteristics
+
+    def setDelegate(self, delegate):
+        self.delegate = delegate
+
+    def writeCharacteristic(self, handle, data, withResponse=False):
+        if handle == self.CMD_HANDLE + 1:
+            self.cmdNotify = data[:1] == b'\x01'
+        elif handle == self.DATA_HANDLE + 1:
+            self.dataNotify = data[:1] == b'\x01'
+        elif handle == self.CMD_HANDLE:
+            self._onCommand(data)
+
+    def waitForNotifications(self, timeout):
+        try:
+            handle, data = self._notifications.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        if self.delegate:
+            self.delegate.handleNotification(handle, data)
+        return True
+
+    def _notify(self, handle, data):
+        # Commands use the same link, but only data frames get lost or reordered.
+        if handle == self.DATA_HANDLE:
+            if self.loss and self._rng.random() < self.loss:
+                self.lost += 1
+                return
+            if self._held is None and self.reorder and self._rng.random() < self.reorder:
+                self._held = (handle, data)
+                self.reordered += 1
+                return
+        self._notifications.put((handle, data))
+        self.sent += 1
+        if handle == self.DATA_HANDLE and self._held is not None:
+            self._notifications.put(self._held)
+            self._held = None
+            self.sent += 1
+
+    def _onCommand(self, data):
+        cmd, payload = data[0], data[1:]
+        result, response = ResponseResult['RSP_CODE_SUCCESS'], b''
+        if cmd == CommandType['CMD_SET_EMG_RAWDATA_CONFIG']:
+            sampRate, channelMask, dataLen, resolution = struct.unpack('<HHBB', payload)
+            if resolution not in (8, 12) or not channelMask or not sampRate:
+                result = ResponseResult['RSP_CODE_BAD_PARAM']
+            else:
+                self.sampRate, self.channelMask, self.dataLen, self.resolution = sampRate, channelMask, dataLen, resolution
+        elif cmd == CommandType['CMD_GET_EMG_RAWDATA_CONFIG']:
+            response = struct.pack('<HHBB', self.sampRate, self.channelMask, self.dataLen, self.resolution)
+        elif cmd == CommandType['CMD_SET_DATA_NOTIF_SWITCH']:
+            self.notifFlags = struct.unpack('<I', payload)[0]
+        elif cmd == CommandType['CMD_GET_FEATURE_MAP']:
+            response = struct.pack('<I', DataNotifFlags['DNF_EMG_RAW'])
+        elif cmd == CommandType['CMD_GET_FW_REVISION']:
+            response = b'sim-1.0'
+        else:
+            result = ResponseResult['RSP_CODE_NOT_SUPPORT']
+        if self.cmdNotify:
+            self._notify(self.CMD_HANDLE, bytes([result, cmd]) + response)
+
+    def _frames(self, packet):
+        # A notification carries at most mtu-3 bytes; longer packets are split into
+        # [NTF_PARTIAL_DATA, frames still to come, content] frames.
+        size = self.mtu - 3
+        if len(packet) <= size:
+            return [packet]
+        size -= 2
+        chunks = [packet[i:i + size] for i in range(0, len(packet), size)]
+        return [bytes([NotifDataType['NTF_PARTIAL_DATA'], len(chunks) - 1 - i]) + chunk
+                for i, chunk in enumerate(chunks)]
+
+    def _samples(self, start, n, nChannels):
+        # Noise around mid-scale whose amplitude alternates between rest (3 s)
+        # and contraction (2 s), roughly like the recordings.
+        full = (1 << self.resolution) - 1
+        t = (start + np.arange(n)) / self.sampRate
+        amplitude = np.where(t % 5 < 3, 0.01, 0.15) * full
+        samples = full // 2 + self._rng.normal(size=(n, nChannels)) * amplitude[:, None]
+        return np.clip(samples, 0, full)
+
+    def _stream(self):
+        sent, next_time = 0, time.perf_counter()
+        while not self._stop.is_set():
+            nChannels = bin(self.channelMask).count('1')
+            dtype = np.dtype('<u2') if self.resolution == 12 else np.dtype(np.uint8)
+            perPacket = max(1, self.dataLen // (nChannels * dtype.itemsize))
+            if self.dataNotify and self.notifFlags & DataNotifFlags['DNF_EMG_RAW']:
+                block = self._samples(sent, perPacket, nChannels).astype(dtype)
+                packet = bytes([NotifDataType['NTF_EMG_ADC_DATA']]) + block.tobytes()
+                for frame in self._frames(packet):
+                    self._notify(self.DATA_HANDLE, frame)
+                sent += perPacket
+            next_time += perPacket / self.sampRate
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            elif delay < -1:
+                # Fell more than a second behind, do not try to catch up.
+                next_time = time.perf_counter()
+
+
+class SimulatedScanEntry():
+    """
+    Stand-in for bluepy.btle.ScanEntry advertising the gForce service.
+    """
+    def __init__(self, addr=SIM_ADDRESS, name='gForce simulated', rssi=-40):
+        self.addr = addr
+        self.addrType = 'public'
+        self.rssi = rssi
+        self.connectable = True
+        self.name = name
+
+    def getScanData(self):
+        return [(7, 'Complete 128b Services', SERVICE_GUID), (9, 'Complete Local Name', self.name)]
+
+    def getValueText(self, adtype):
+        return self.name if adtype == 9 else None
+
+
+class SimulatedScanner():
+    """
+    Stand-in for bluepy.btle.Scanner that finds one simulated armband.
+    """
+    def scan(self, timeout=10, passive=False):
+        return [SimulatedScanEntry()]
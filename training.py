@@ -0,0 +1,171 @@
+"""
+Cross-validation and hyperparameter search for the motion classifier.
+
+    python training.py Subject_2 --cv rep --C 1 100 10000 --windowLength 50 100 --windowOverlap 0.5
+    python training.py Subject_2 --cv shift --random 10 --jobs 4
+
+Every combination of window parameters is built once with dataset.build_dataset
+(cached per file), written to a memory-mapped .npy file shared by all worker
+processes, and every (C, fold) pair is fitted in parallel with joblib.
+"""
+import argparse
+import itertools
+import os
+import tempfile
+import time
+import numpy as np
+from joblib import Parallel, delayed
+
+from dataset import CACHE_DIR, build_dataset, find_trials
+
+# Metadata fields the folds can be split by.
+CV_GROUPS = ('rep', 'shift')
+
+
+def leave_one_group_out(groups):
+    """
+    Yields (group, train indices, test indices) for every distinct value in groups,
+    e.g. leave-one-rep-out with meta['rep'] or leave-one-shift-out with meta['shift'].
+    """
+    for group in np.unique(groups):
+        test = groups == group
+        yield group, np.flatnonzero(~test), np.flatnonzero(test)
+
+
+def _fit_fold(featuresPath, labels, train, test, C, maxIter):
+    from sklearn.linear_model import LogisticRegression
+
+    # Opened read-only in the worker; all processes share the page cache instead of copies.
+    features = np.load(featuresPath, mmap_mode='r')
+    t0 = time.perf_counter()
+    model = LogisticRegression(penalty='l2', C=C, max_iter=maxIter).fit(features[train], labels[train])
+    fitTime = time.perf_counter() - t0
+    testFeatures = features[test]
+    t0 = time.perf_counter()
+    predicted = model.predict(testFeatures)
+    predictTime = time.perf_counter() - t0
+    return dict(accuracy=float(np.mean(predicted == labels[test])), fit_s=fitTime,
+                predict_us=1e6 * predictTime / max(len(test), 1), n_train=len(train), n_test=len(test))
+
+
+def parameter_grid(C=(10000,), windowLength=(50,), windowOverlap=(0.5,), nRandom=None, seed=0):
+    """
+    Returns the parameter combinations to evaluate.
+
+    Args:
+        C (iterable of float): Inverse regularization strengths of the logistic regression.
+        windowLength (iterable of int): Window lengths in samples.
+        windowOverlap (iterable of float): Overlaps as a fraction of the window length.
+        nRandom (int): Evaluate this many random combinations instead of all of them.
+        seed (int): Seed of the random choice.
+
+    Returns:
+        list of dict: C, windowLength and windowOverlap (in samples) of every combination.
+    """
+    grid = [dict(C=c, windowLength=length, windowOverlap=int(np.floor(overlap * length)))
+            for c, length, overlap in itertools.product(C, windowLength, windowOverlap)]
+    if nRandom and nRandom < len(grid):
+        chosen = np.random.default_rng(seed).choice(len(grid), nRandom, replace=False)
+        grid = [grid[i] for i in sorted(chosen)]
+    return grid
+
+
+def run_search(trials, grid, cv='rep', jobs=-1, maxIter=100, cacheDir=CACHE_DIR):
+    """
+    Cross-validates every parameter combination.
+
+    Args:
+        trials (list of dict): Trials as returned by dataset.find_trials().
+        grid (list of dict): Combinations from parameter_grid().
+        cv (str): 'rep' for leave-one-rep-out, 'shift' for leave-one-shift-out.
+        jobs (int): Number of worker processes, -1 for all cores.
+        maxIter (int): Iteration limit of the logistic regression solver.
+        cacheDir (str): Feature cache of dataset.build_dataset().
+
+    Returns:
+        list of dict: One row per combination and left-out group with the parameters,
+        accuracy, fit time in seconds, prediction time per window in microseconds and
+        the fold sizes.
+    """
+    results = []
+    windowParams = sorted({(p['windowLength'], p['windowOverlap']) for p in grid})
+    with tempfile.TemporaryDirectory() as tmp, Parallel(n_jobs=jobs) as parallel:
+        for windowLength, windowOverlap in windowParams:
+            t0 = time.perf_counter()
+            features, labels, meta = build_dataset(trials, windowLength, windowOverlap, cacheDir=cacheDir,
+                                                   workers=None if jobs == -1 else jobs)
+            featuresPath = os.path.join(tmp, f'features_{windowLength}_{windowOverlap}.npy')
+            np.save(featuresPath, features)
+            del features
+            print(f"windowLength {windowLength}, windowOverlap {windowOverlap}: {len(labels)} windows "
+                  f"built in {time.perf_counter() - t0:.1f} s")
+
+            folds = list(leave_one_group_out(meta[cv]))
+            params = [p for p in grid if (p['windowLength'], p['windowOverlap']) == (windowLength, windowOverlap)]
+            tasks = [(p, group, train, test) for p in params for group, train, test in folds]
+            scores = parallel(delayed(_fit_fold)(featuresPath, labels, train, test, p['C'], maxIter)
+                              for p, _, train, test in tasks)
+            for (p, group, _, _), score in zip(tasks, scores):
+                results.append(dict(p, **{cv: int(group)}, **score))
+    return results
+
+
+def summarize(results):
+    """
+    Averages the folds of every parameter combination.
+
+    Returns:
+        list of dict: C, windowLength, windowOverlap, mean and standard deviation of the
+        accuracy, mean fit and prediction time, best first.
+    """
+    keys = sorted({(r['C'], r['windowLength'], r['windowOverlap']) for r in results})
+    summary = []
+    for C, windowLength, windowOverlap in keys:
+        rows = [r for r in results if (r['C'], r['windowLength'], r['windowOverlap']) == (C, windowLength, windowOverlap)]
+        accuracy = np.array([r['accuracy'] for r in rows])
+        summary.append(dict(C=C, windowLength=windowLength, windowOverlap=windowOverlap, folds=len(rows),
+                            accuracy=accuracy.mean(), accuracy_std=accuracy.std(),
+                            fit_s=np.mean([r['fit_s'] for r in rows]),
+                            predict_us=np.mean([r['predict_us'] for r in rows])))
+    return sorted(summary, key=lambda row: -row['accuracy'])
+
+
+def print_table(summary):
+    print(f"{'C':>10}{'length':>8}{'overlap':>9}{'folds':>7}{'accuracy':>10}{'std':>7}{'fit s':>8}{'us/window':>11}")
+    for row in summary:
+        print(f"{row['C']:>10g}{row['windowLength']:>8}{row['windowOverlap']:>9}{row['folds']:>7}"
+              f"{row['accuracy']:>10.3f}{row['accuracy_std']:>7.3f}{row['fit_s']:>8.2f}{row['predict_us']:>11.2f}")
+
+
+def write_csv(results, path):
+    columns = list(results[0])
+    with open(path, 'w') as f:
+        f.write(','.join(columns) + '\n')
+        for row in results:
+            f.write(','.join(str(row[c]) for c in columns) + '\n')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('subjects', nargs='+', help='subject directories, e.g. Subject_2')
+    parser.add_argument('--shifts', type=int, nargs='*', help='electrode shifts to use, all by default')
+    parser.add_argument('--cv', choices=CV_GROUPS, default='rep',
+                        help='leave one rep out or leave one shift out')
+    parser.add_argument('--C', type=float, nargs='+', default=[10000])
+    parser.add_argument('--windowLength', type=int, nargs='+', default=[50], help='window lengths in samples')
+    parser.add_argument('--windowOverlap', type=float, nargs='+', default=[0.5],
+                        help='overlaps as a fraction of the window length')
+    parser.add_argument('--random', type=int, help='evaluate this many random combinations')
+    parser.add_argument('--jobs', type=int, default=-1, help='worker processes, -1 for all cores')
+    parser.add_argument('--maxIter', type=int, default=100)
+    parser.add_argument('--csv', help='write every fold result to this file')
+    args = parser.parse_args()
+
+    trials = [trial for subject in args.subjects for trial in find_trials(subject, args.shifts)]
+    grid = parameter_grid(args.C, args.windowLength, args.windowOverlap, args.random)
+    t0 = time.perf_counter()
+    results = run_search(trials, grid, args.cv, args.jobs, args.maxIter)
+    print(f"{len(results)} fits in {time.perf_counter() - t0:.1f} s")
+    print_table(summarize(results))
+    if args.csv:
+        write_csv(results, args.csv)
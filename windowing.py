@@ -0,0 +1,101 @@
+class WindowEngine():
+    """
+    Event-driven sliding-window reader on top of a SampleRingBuffer.
+
+    Windows of `length` samples are produced every `hop` samples as soon as the
+    data for them has arrived, each exactly once and in order. Readers block on
+    the buffer's condition variable instead of polling with sleeps.
+
+    Attributes:
+        buffer (SampleRingBuffer): The sample source.
+        length (int): Window length in samples.
+        hop (int): Distance between consecutive window starts in samples.
+        latest_only (bool): If set, pending windows are skipped and only the newest is produced.
+        cursor (int): Absolute sample index of the next window start.
+        skipped (int): Windows skipped on purpose (catch-up policy).
+        dropped (int): Windows lost because the buffer overwrote them before they were read.
+
+    Methods:
+        next_window(timeout): Waits for and returns the next window.
+        skip_to_latest(): Jumps the cursor to the newest complete window.
+    """
+    def __init__(self, buffer, length=50, hop=25, latest_only=False, start=0):
+        """
+        Args:
+            buffer (SampleRingBuffer): The sample source.
+            length (int): Window length in samples, at most buffer.margin.
+            hop (int): Distance between consecutive window starts in samples.
+            latest_only (bool): Produce only the newest window when falling behind.
+            start (int): Absolute sample index of the first window.
+        """
+        if length > buffer.margin:
+            raise ValueError(f"window length {length} exceeds buffer margin {buffer.margin}")
+        self.buffer = buffer
+        self.length = length
+        self.hop = hop
+        self.latest_only = latest_only
+        self.cursor = start
+        self.skipped = 0
+        self.dropped = 0
+
+    @property
+    def backlog(self):
+        """Number of complete windows that are ready but not produced yet."""
+        ready = self.buffer.count - self.cursor - self.length
+        return ready // self.hop + 1 if ready >= 0 else 0
+
+    def skip_to_latest(self):
+        """
+        Moves the cursor to the newest complete window, discarding the older pending ones.
+        Safe to call from another thread than the one reading windows, e.g. the UI thread.
+
+        Returns:
+            int: Number of windows skipped.
+        """
+        # The buffer's condition lock is reentrant, next_window() calls this while holding it.
+        with self.buffer.cond:
+            n = self.backlog - 1
+            if n > 0:
+                self.cursor += n * self.hop
+                self.skipped += n
+                return n
+            return 0
+
+    def _check_overrun(self):
+        # Windows starting before the oldest buffered sample are gone for good.
+        behind = self.buffer.oldest - self.cursor
+        if behind > 0:
+            n = -(-behind // self.hop)
+            self.cursor += n * self.hop
+            self.dropped += n
+
+    def next_window(self, timeout=None):
+        """
+        Waits until the next window is complete and returns it.
+
+        Args:
+            timeout (float): Maximum time to wait in seconds, None waits forever.
+
+        Returns:
+            tuple (int, array [length, n_channels]): Start index and zero-copy view
+            of the window, or None on timeout.
+        """
+        while True:
+            if not self.buffer.wait_for(self.cursor + self.length, timeout):
+                return None
+            # The cursor only changes under the buffer's lock, so a skip_to_latest() from
+            # another thread cannot be lost between reading and advancing it.
+            with self.buffer.cond:
+                self._check_overrun()
+                if self.cursor + self.length > self.buffer.count:
+                    continue
+                if self.latest_only:
+                    self.skip_to_latest()
+                start = self.cursor
+                window = self.buffer.window(start, self.length)
+                self.cursor += self.hop
+                return start, window
+
+    def __iter__(self):
+        while True:
+            yield self.next_window()